@@ -0,0 +1,80 @@
+# Cold import time of the app modules, each measured in a fresh interpreter with python -X importtime.
+#
+#   python -m benchmarks.import_time
+#   python -m benchmarks.import_time --repeats 5 --top 15
+#
+# "startup" is everything streamlit_app.py imports before a page is opened, the page modules
+# are imported on top of it when their page is first used.
+import argparse
+import subprocess
+import sys
+
+STARTUP_MODULES = [
+    'streamlit', 'pandas', 'streamlit_option_menu',
+    'scripts.sapi', 'scripts.search', 'scripts.viz', 'scripts.memo', 'scripts.anomalies', 'scripts.geo'
+]
+PAGE_MODULES = {
+    'Locations': ['scripts.locations'],
+    'Overview': ['scripts.overview'],
+    'AI Analysis': ['scripts.ai_analysis'],
+    'Support': ['scripts.support'],
+    'Assistant': ['scripts.openai']
+}
+FIRST_USE_MODULES = {
+    'Keboola (data load, write-back)': ['keboola_streamlit', 'kbcstorage.client'],
+    'OpenAI SDK (drafts, Assistant)': ['scripts.openai_client'],
+    'Plotly figures': ['plotly.express']
+}
+
+
+def import_times(modules, baseline=()):
+    # Returns {top-level package: cumulative microseconds} for the imports not already done by baseline.
+    statements = [f'import {module}' for module in baseline]
+    statements.append('import sys; sys.stderr.write("--- measured ---\\n")')
+    statements += [f'import {module}' for module in modules]
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', '; '.join(statements)],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    measured = result.stderr.split('--- measured ---\n', 1)[1]
+    packages = {}
+    for line in measured.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # Top-level entries of the import tree have no indentation in front of the module name.
+        if name.startswith(' ') and not name.startswith('  '):
+            package = name.strip().split('.')[0]
+            packages[package] = packages.get(package, 0) + int(cumulative)
+    return packages
+
+
+def best_of(repeats, modules, baseline=()):
+    runs = [import_times(modules, baseline) for _ in range(repeats)]
+    return min(runs, key=lambda packages: sum(packages.values()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold import time of the app modules')
+    parser.add_argument('--repeats', type=int, default=3, help='report the fastest of N runs')
+    parser.add_argument('--top', type=int, default=10, help='number of heaviest startup packages to list')
+    args = parser.parse_args()
+
+    startup = best_of(args.repeats, STARTUP_MODULES)
+    print(f"{'startup':<44}{sum(startup.values()) / 1e6:>8.2f}s")
+    for package, microseconds in sorted(startup.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {package:<42}{microseconds / 1e6:>8.2f}s")
+
+    print()
+    for title, groups in (('page', PAGE_MODULES), ('first use', FIRST_USE_MODULES)):
+        for name, modules in groups.items():
+            try:
+                packages = best_of(args.repeats, modules, baseline=STARTUP_MODULES)
+            except RuntimeError as e:
+                print(f"{title} {name:<39}  failed: {e}")
+                continue
+            print(f"{title + ' ' + name:<44}{sum(packages.values()) / 1e6:>+8.2f}s")
+
+
+if __name__ == '__main__':
+    main()
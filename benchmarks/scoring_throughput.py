@@ -0,0 +1,90 @@
+# Throughput of the local sentiment/keyword scoring compared with one LLM call per review.
+#
+#   python -m benchmarks.scoring_throughput --reviews 200000
+#   python -m benchmarks.scoring_throughput --csv reviews.csv --llm-samples 20
+#
+# The LLM part needs OPENAI_API_KEY (and optionally OPENAI_BASE_URL) in the environment.
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from scripts.scoring import score_reviews, POSITIVE_WORDS, NEGATIVE_WORDS
+
+FILLER_WORDS = ['the', 'staff', 'store', 'phone', 'sim', 'roaming', 'contract', 'was', 'and', 'not', 'very', 'my']
+
+
+def synthetic_reviews(size, seed=0):
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(sorted(POSITIVE_WORDS) + sorted(NEGATIVE_WORDS) + FILLER_WORDS * 10)
+    lengths = rng.integers(5, 60, size)
+    words = rng.choice(vocabulary, lengths.sum())
+    texts = [' '.join(chunk) for chunk in np.split(words, np.cumsum(lengths)[:-1])]
+    return pd.Series(texts), pd.Series(rng.integers(1, 6, size))
+
+
+def benchmark_local(texts, ratings, batch_size, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for offset in range(0, len(texts), batch_size):
+            score_reviews(texts.iloc[offset:offset + batch_size], ratings.iloc[offset:offset + batch_size].values)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {'reviews': len(texts), 'seconds': best, 'reviews_per_second': len(texts) / best}
+
+
+def benchmark_llm(texts, samples, model):
+    from openai import OpenAI
+
+    client = OpenAI(base_url=os.environ.get('OPENAI_BASE_URL'))
+    latencies = []
+    for text in texts.iloc[:samples]:
+        start = time.perf_counter()
+        client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": (
+                    "Classify the sentiment of the review as Positive, Negative or Mixed and list up to 5 keywords. "
+                    f"Return JSON with keys sentiment and keywords.\n\nReview:\n{text}"
+                )}
+            ],
+            temperature=0
+        )
+        latencies.append(time.perf_counter() - start)
+    total = sum(latencies)
+    return {'reviews': len(latencies), 'seconds': total, 'reviews_per_second': len(latencies) / total,
+            'p50_latency': float(np.median(latencies)), 'p95_latency': float(np.percentile(latencies, 95))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local scoring vs. per-review LLM throughput')
+    parser.add_argument('--reviews', type=int, default=100000, help='number of synthetic reviews')
+    parser.add_argument('--csv', help='score REVIEW_TEXT/RATING from this CSV instead of synthetic reviews')
+    parser.add_argument('--batch-size', type=int, default=50000)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--llm-samples', type=int, default=0, help='number of reviews to score with one LLM call each')
+    parser.add_argument('--model', default='gpt-4o')
+    args = parser.parse_args()
+
+    if args.csv:
+        reviews = pd.read_csv(args.csv, usecols=['REVIEW_TEXT', 'RATING']).dropna(subset=['REVIEW_TEXT'])
+        texts, ratings = reviews['REVIEW_TEXT'].reset_index(drop=True), reviews['RATING'].reset_index(drop=True)
+    else:
+        texts, ratings = synthetic_reviews(args.reviews)
+
+    local = benchmark_local(texts, ratings, args.batch_size, args.repeats)
+    print(f"local: {local['reviews']:,} reviews in {local['seconds']:.2f}s ({local['reviews_per_second']:,.0f} reviews/s)")
+
+    if args.llm_samples > 0:
+        llm = benchmark_llm(texts, args.llm_samples, args.model)
+        print(f"llm:   {llm['reviews']:,} reviews in {llm['seconds']:.2f}s ({llm['reviews_per_second']:,.2f} reviews/s, "
+              f"p50 {llm['p50_latency']:.2f}s, p95 {llm['p95_latency']:.2f}s)")
+        print(f"local scoring is {local['reviews_per_second'] / llm['reviews_per_second']:,.0f}x faster")
+
+
+if __name__ == '__main__':
+    main()
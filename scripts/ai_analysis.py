@@ -1,12 +1,14 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
 import networkx as nx
 import matplotlib.pyplot as plt
 import plotly.express as px
 
 from wordcloud import WordCloud
-from scripts.viz import sentiment_color
+from scripts.viz import time_buckets, rating_color_scale
+from scripts.memo import memoize, memoize_figure
+
+ROLLING_WINDOW = 7
 
 def create_network_graph(attributes, slider_entities):
     # Get top entities by total attribute counts
@@ -119,22 +121,52 @@ def display_network_graph(attributes):
     col1.pyplot(fig, use_container_width=True)
 
 
-def ai_analysis(data, attributes):
-    ## SENTIMENT COUNT BY DATE
-    data['REVIEW_DATE'] = pd.to_datetime(data['REVIEW_DATE']).dt.date
-    avg_rating_per_day = data.groupby('REVIEW_DATE')['RATING'].mean().reset_index()
-    color_scale = avg_rating_per_day['RATING'].apply(lambda x: '#EA4335' if x < 1.5 else '#e98f41' if x < 2.5 else '#FBBC05' if x < 3.6 else '#a5c553' if x < 4.5 else '#34A853').tolist()
+def average_rating_per_bucket(data):
+    review_dates, bucket_label = time_buckets(data['REVIEW_DATE'])
+    avg_rating_per_day = data.groupby(review_dates)['RATING'].agg(['mean', 'sum', 'count']).reset_index().rename(columns={'mean': 'RATING'})
+    return avg_rating_per_day, bucket_label
 
+
+def average_rating_chart(avg_rating_per_day, bucket_label, show_rolling):
+    color_scale = rating_color_scale(avg_rating_per_day['RATING'])
     fig_avg_rating_per_day = px.line(
         avg_rating_per_day,
         x='REVIEW_DATE',
         y='RATING',
         labels={'RATING': 'Average Rating', 'REVIEW_DATE': 'Date'},
-        title='Average Rating per Date',
+        title=f'Average Rating per {bucket_label}',
         height=300
     )
     fig_avg_rating_per_day.update_traces(mode='lines+markers', hovertemplate='Avg Rating: %{y:.2f}<extra></extra>', line=dict(color='#E6E6E6'), marker=dict(color=color_scale))  
+    if show_rolling:
+        rolling = avg_rating_per_day[['sum', 'count']].rolling(ROLLING_WINDOW, min_periods=1).sum()
+        fig_avg_rating_per_day.add_scatter(
+            x=avg_rating_per_day['REVIEW_DATE'],
+            y=rolling['sum'] / rolling['count'],
+            mode='lines',
+            line=dict(color='#238dff', width=2),
+            hovertemplate='Rolling Avg: %{y:.2f}<extra></extra>',
+            showlegend=False
+        )
     fig_avg_rating_per_day.update_layout(xaxis_title=None, yaxis_title=None, hovermode='x')
+    return fig_avg_rating_per_day
+
+
+def keyword_cloud(data, width=2500, height=500):
+    keywords_text = " ".join(data['KEYWORDS'].dropna().astype(str).values).replace("'", "")
+    return WordCloud(width=width, height=height, background_color='white', colormap='CMRmap_r').generate(keywords_text).to_array()
+
+
+def ai_analysis(data, attributes, signature=None):
+    ## SENTIMENT COUNT BY DATE
+    avg_rating_per_day, bucket_label = memoize(signature, 'average_rating_per_bucket', lambda: average_rating_per_bucket(data))
+
+    show_rolling = st.toggle(f'Rolling average ({ROLLING_WINDOW} {bucket_label.lower()}s)', key='rolling_average')
+
+    fig_avg_rating_per_day = memoize_figure(
+        signature, ('average_rating_chart', show_rolling),
+        lambda: average_rating_chart(avg_rating_per_day, bucket_label, show_rolling)
+    )
     st.plotly_chart(fig_avg_rating_per_day, use_container_width=True)
 
     ## ENTITY-ATTRIBUTE RELATIONS
@@ -153,7 +185,7 @@ def ai_analysis(data, attributes):
     st.dataframe(data[columns],
                 #.style.map(sentiment_color, subset=["SENTIMENT"]),
                 column_config={
-                    'REVIEW_DATE': 'Date',
+                    'REVIEW_DATE': st.column_config.DateColumn('Date'),
                     'RATING': 'Rating',
                     'REVIEW_TEXT': st.column_config.Column(
                         'Review',
@@ -177,9 +209,8 @@ def ai_analysis(data, attributes):
                 use_container_width=True)
     
     st.markdown("##### Keywords")
-    # Import the WordCloud class
-    keywords_text = " ".join(data['KEYWORDS'].dropna().astype(str).values).replace("'", "")
-    wordcloud = WordCloud(width=2500, height=500, background_color='white', colormap='CMRmap_r').generate(keywords_text)
+    # The rendered image is cached, generating the layout is the slow part
+    wordcloud = memoize(signature, 'keyword_cloud', lambda: keyword_cloud(data))
     # Create new figure and axis
     fig, ax = plt.subplots(figsize=(10, 10))
     ax.imshow(wordcloud, interpolation='bilinear')
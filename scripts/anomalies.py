@@ -0,0 +1,144 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import math
+import threading
+
+from collections import deque
+
+from scripts.sapi import data_version, parsed_dates, review_id_index
+
+FAST_ALPHA = 0.3
+SLOW_ALPHA = 0.03
+Z_THRESHOLD = 3.0
+MIN_REVIEWS = 20
+MIN_RATING_STD = 0.5
+MIN_NEGATIVE_SHARE = 0.05
+# Reviews reach the baseline only once they are this far behind the latest one, about twice the fast window.
+BASELINE_LAG = 10
+# Rows compared with the previous load to tell whether new rows were only appended.
+ANCHOR_ROWS = 16
+# Standard error of the fast EWMA per baseline standard deviation, if the location still behaved like its baseline.
+FAST_FACTOR = math.sqrt(FAST_ALPHA / (2 - FAST_ALPHA))
+
+
+class AnomalyTracker:
+    # Per-location EWMA statistics of RATING and of the Negative SENTIMENT share.
+    # A fast average follows the latest reviews, a slow average with its variance is the baseline,
+    # and a location is flagged when the fast average departs from the baseline by Z_THRESHOLD standard errors.
+    # The baseline lags BASELINE_LAG reviews behind and is frozen while the location deviates,
+    # so a lasting drop stays flagged instead of becoming the new normal.
+    # Only reviews that were not seen before are folded in, in review date order.
+    def __init__(self):
+        self.state = {}
+        self.lagged = {}
+        self.processed = set()
+        self.rows = 0
+        self.anchors = None
+        self.version = None
+        self.alerts = None
+        self.lock = threading.Lock()
+
+    def update(self, df):
+        with self.lock:
+            version = data_version(df)
+            if version is not None and version == self.version:
+                return self.alerts
+            if self.appended_to_last(df):
+                # Only the rows after the previous load are looked at.
+                tail = df.iloc[self.rows:]
+                new_reviews = tail[[review_id not in self.processed for review_id in tail['REVIEW_ID'].astype(str).tolist()]]
+                new_reviews = new_reviews.assign(REVIEW_DATE=pd.to_datetime(new_reviews['REVIEW_DATE']))
+            else:
+                review_ids = review_id_index(df).tolist()
+                new_rows = np.fromiter((review_id not in self.processed for review_id in review_ids), dtype=bool, count=len(review_ids))
+                new_reviews = df[new_rows].assign(REVIEW_DATE=parsed_dates(df)[new_rows])
+            new_reviews = new_reviews.sort_values('REVIEW_DATE', kind='stable').drop_duplicates('REVIEW_ID')
+            negative = (new_reviews['SENTIMENT'] == 'Negative').astype(float).tolist()
+            for place_id, rating, is_negative in zip(new_reviews['PLACE_ID'].tolist(), new_reviews['RATING'].astype(float).tolist(), negative):
+                self.add_review(place_id, rating, is_negative)
+            self.processed.update(new_reviews['REVIEW_ID'].astype(str).tolist())
+            self.rows = len(df)
+            positions = np.unique(np.linspace(0, len(df) - 1, ANCHOR_ROWS).astype(int)) if len(df) else np.array([], dtype=int)
+            self.anchors = positions, df['REVIEW_ID'].iloc[positions].astype(str).values
+            self.version = version
+            self.alerts = self.detect()
+            return self.alerts
+
+    def appended_to_last(self, df):
+        # True when df looks like the previous load with rows added at the end, checked on a few anchor rows.
+        if self.anchors is None or len(df) < self.rows:
+            return False
+        positions, review_ids = self.anchors
+        return bool(np.array_equal(df['REVIEW_ID'].iloc[positions].astype(str).values, review_ids))
+
+    def add_review(self, place_id, rating, negative):
+        stats = self.state.get(place_id)
+        if stats is None:
+            self.state[place_id] = {'count': 1, 'fast_rating': rating, 'slow_rating': rating, 'rating_var': 0.0,
+                                    'fast_negative': negative, 'slow_negative': negative}
+            self.lagged[place_id] = deque()
+            return
+        stats['count'] += 1
+        stats['fast_rating'] += FAST_ALPHA * (rating - stats['fast_rating'])
+        stats['fast_negative'] += FAST_ALPHA * (negative - stats['fast_negative'])
+        lagged = self.lagged[place_id]
+        lagged.append((rating, negative))
+        if len(lagged) <= BASELINE_LAG:
+            return
+        rating, negative = lagged.popleft()
+        # Frozen while flagged, the same test as in detect.
+        if stats['count'] >= MIN_REVIEWS:
+            rating_drop = stats['fast_rating'] - stats['slow_rating']
+            if rating_drop < 0 and rating_drop / (max(math.sqrt(stats['rating_var']), MIN_RATING_STD) * FAST_FACTOR) <= -Z_THRESHOLD:
+                return
+            negative_rise = stats['fast_negative'] - stats['slow_negative']
+            if negative_rise > 0:
+                negative_share = min(max(stats['slow_negative'], MIN_NEGATIVE_SHARE), 1 - MIN_NEGATIVE_SHARE)
+                if negative_rise / (math.sqrt(negative_share * (1 - negative_share)) * FAST_FACTOR) >= Z_THRESHOLD:
+                    return
+        diff = rating - stats['slow_rating']
+        increment = SLOW_ALPHA * diff
+        stats['slow_rating'] += increment
+        stats['rating_var'] = (1 - SLOW_ALPHA) * (stats['rating_var'] + diff * increment)
+        stats['slow_negative'] += SLOW_ALPHA * (negative - stats['slow_negative'])
+
+    def detect(self):
+        columns = ['PLACE_ID', 'REVIEWS', 'BASELINE_RATING', 'RECENT_RATING', 'RATING_Z',
+                   'BASELINE_NEGATIVE', 'RECENT_NEGATIVE', 'NEGATIVE_Z', 'ALERT']
+        if not self.state:
+            return pd.DataFrame(columns=columns)
+        stats = pd.DataFrame.from_dict(self.state, orient='index')
+        rating_se = np.maximum(np.sqrt(stats['rating_var']), MIN_RATING_STD) * FAST_FACTOR
+        negative_share = stats['slow_negative'].clip(MIN_NEGATIVE_SHARE, 1 - MIN_NEGATIVE_SHARE)
+        negative_se = np.sqrt(negative_share * (1 - negative_share)) * FAST_FACTOR
+
+        alerts = pd.DataFrame({
+            'PLACE_ID': stats.index,
+            'REVIEWS': stats['count'].values,
+            'BASELINE_RATING': stats['slow_rating'].values,
+            'RECENT_RATING': stats['fast_rating'].values,
+            'RATING_Z': ((stats['fast_rating'] - stats['slow_rating']) / rating_se).values,
+            'BASELINE_NEGATIVE': stats['slow_negative'].values,
+            'RECENT_NEGATIVE': stats['fast_negative'].values,
+            'NEGATIVE_Z': ((stats['fast_negative'] - stats['slow_negative']) / negative_se).values
+        })
+        rating_drop = alerts['RATING_Z'] <= -Z_THRESHOLD
+        negative_rise = alerts['NEGATIVE_Z'] >= Z_THRESHOLD
+        alerts['ALERT'] = np.select(
+            [rating_drop & negative_rise, rating_drop, negative_rise],
+            ['Rating drop, more negative reviews', 'Rating drop', 'More negative reviews'],
+            default=''
+        )
+        alerts = alerts[(alerts['ALERT'] != '') & (alerts['REVIEWS'] >= MIN_REVIEWS)]
+        return alerts.sort_values('RATING_Z').reset_index(drop=True)[columns]
+
+
+@st.cache_resource(show_spinner=False)
+def get_anomaly_tracker():
+    return AnomalyTracker()
+
+
+def rating_anomalies(df):
+    # Locations whose recent reviews dropped significantly, updated with the reviews added since the last load.
+    return get_anomaly_tracker().update(df)
@@ -0,0 +1,169 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import threading
+
+from collections import OrderedDict
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 64
+NUM_BANDS = 16
+MIN_TEXT_LENGTH = 30
+SIMILARITY_THRESHOLD = 0.8
+CHUNK_SIZE = 500
+# Clusters kept for the most recent table versions, e.g. the slices open in different sessions.
+MAX_VERSIONS = 4
+
+# Multiply-shift hash family, uint64 arithmetic wraps around so no modulo is needed.
+_rng = np.random.default_rng(42)
+PERM_A = _rng.integers(0, np.iinfo(np.uint64).max, size=NUM_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+PERM_B = _rng.integers(0, np.iinfo(np.uint64).max, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def normalize_text(texts):
+    return (
+        texts.fillna('').astype(str).str.lower()
+        .str.replace(r'[^\w\s]', ' ', regex=True)
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+    )
+
+
+def minhash_signatures(texts):
+    # Character shingles are hashed with a rolling polynomial hash over all documents at once,
+    # then reduced to one minimum per permutation and document with np.minimum.reduceat.
+    signatures = np.empty((len(texts), NUM_PERMUTATIONS), dtype=np.uint32)
+    for start in range(0, len(texts), CHUNK_SIZE):
+        chunk = texts[start:start + CHUNK_SIZE]
+        encoded = [text.encode('utf-8') for text in chunk]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+
+        num_shingles = np.maximum(lengths - SHINGLE_SIZE + 1, 1)
+        doc_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        doc_offsets = np.concatenate(([0], np.cumsum(num_shingles)[:-1]))
+
+        # Position of every shingle in the joined buffer, at least one shingle per document.
+        doc_index = np.repeat(np.arange(len(chunk)), num_shingles)
+        positions = doc_starts[doc_index] + (np.arange(num_shingles.sum()) - doc_offsets[doc_index])
+
+        shingle_hashes = np.zeros(len(positions), dtype=np.uint64)
+        padded = np.concatenate((buffer, np.zeros(SHINGLE_SIZE, dtype=np.uint64)))
+        for k in range(SHINGLE_SIZE):
+            shingle_hashes = shingle_hashes * np.uint64(1099511628211) + padded[positions + k]
+
+        permuted = ((PERM_A[:, None] * shingle_hashes + PERM_B[:, None]) >> np.uint64(32)).astype(np.uint32)
+        signatures[start:start + len(chunk)] = np.minimum.reduceat(permuted, doc_offsets, axis=1).T
+    return signatures
+
+
+def connected_components(n, a, b):
+    # Component label (its smallest member) of each of n nodes joined by the edges a-b. Labels are
+    # hooked onto the smaller label across every edge, then shortcut by pointer jumping until stable.
+    labels = np.arange(n)
+    while len(a):
+        low = np.minimum(labels[a], labels[b])
+        np.minimum.at(labels, labels[a], low)
+        np.minimum.at(labels, labels[b], low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels[a], labels[b]):
+            break
+    return labels
+
+
+def find_clusters(review_ids, signatures):
+    # LSH banding: documents sharing any band bucket become candidates, candidates are verified
+    # by their estimated Jaccard similarity before being joined into connected components.
+    n = len(review_ids)
+    edges_a, edges_b = [], []
+    rows_per_band = NUM_PERMUTATIONS // NUM_BANDS
+    for band in range(NUM_BANDS):
+        # The rows of a band are folded into one uint64 bucket key, collisions are caught by the similarity check.
+        band_key = np.zeros(n, dtype=np.uint64)
+        for row in range(band * rows_per_band, (band + 1) * rows_per_band):
+            band_key = band_key * np.uint64(1099511628211) + signatures[:, row]
+        _, bucket, counts = np.unique(band_key, return_inverse=True, return_counts=True)
+        members = np.flatnonzero(counts[bucket] > 1)
+        if len(members) == 0:
+            continue
+        members = members[np.argsort(bucket[members], kind='stable')]
+        member_buckets = bucket[members]
+        first = np.r_[True, member_buckets[1:] != member_buckets[:-1]]
+        heads = members[np.maximum.accumulate(np.where(first, np.arange(len(members)), 0))]
+
+        similar = (signatures[members] == signatures[heads]).mean(axis=1) >= SIMILARITY_THRESHOLD
+        edges_a.append(members[similar & ~first])
+        edges_b.append(heads[similar & ~first])
+
+    edges_a = np.concatenate(edges_a) if edges_a else np.array([], dtype=np.int64)
+    edges_b = np.concatenate(edges_b) if edges_b else np.array([], dtype=np.int64)
+    roots = connected_components(n, edges_a, edges_b)
+    clusters = pd.DataFrame({'REVIEW_ID': review_ids, 'ROOT': roots})
+    clusters['CLUSTER_SIZE'] = clusters.groupby('ROOT')['ROOT'].transform('size')
+    clusters = clusters[clusters['CLUSTER_SIZE'] > 1]
+    clusters['CLUSTER_ID'] = clusters.groupby('ROOT').ngroup()
+    return clusters[['REVIEW_ID', 'CLUSTER_ID', 'CLUSTER_SIZE']].reset_index(drop=True)
+
+
+class DuplicateDetector:
+    # Clusters the reviews of one table version in a background thread, off the request path.
+    # Signatures are kept for the reviews of the last computed version only, so a new version
+    # shingles just its new reviews, and every version is clustered from its own reviews alone.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.compute_lock = threading.Lock()
+        self.signatures = pd.DataFrame(np.empty((0, NUM_PERMUTATIONS), dtype=np.uint32), index=pd.Index([], dtype=object))
+        self.clusters = OrderedDict()
+        self.requested = set()
+
+    def get(self, reviews_data, version):
+        # The clusters of version, or None while they are being computed.
+        with self.lock:
+            if version in self.clusters:
+                self.clusters.move_to_end(version)
+                return self.clusters[version]
+            if version not in self.requested:
+                self.requested.add(version)
+                threading.Thread(target=self.update, args=(reviews_data, version), daemon=True).start()
+            return None
+
+    def update(self, reviews_data, version):
+        try:
+            self.compute(reviews_data, version)
+        finally:
+            with self.lock:
+                self.requested.discard(version)
+
+    def compute(self, reviews_data, version):
+        with self.compute_lock:
+            texts = normalize_text(reviews_data['REVIEW_TEXT'])
+            candidates = pd.DataFrame({'REVIEW_ID': reviews_data['REVIEW_ID'].astype(str), 'TEXT': texts})
+            candidates = candidates[candidates['TEXT'].str.len() >= MIN_TEXT_LENGTH].drop_duplicates('REVIEW_ID')
+            review_ids = pd.Index(candidates['REVIEW_ID'].to_numpy(dtype=object))
+
+            known = self.signatures.index.get_indexer(review_ids)
+            signatures = np.empty((len(review_ids), NUM_PERMUTATIONS), dtype=np.uint32)
+            signatures[known >= 0] = self.signatures.to_numpy()[known[known >= 0]]
+            new = np.flatnonzero(known < 0)
+            if len(new):
+                signatures[new] = minhash_signatures(candidates['TEXT'].iloc[new].tolist())
+
+            clusters = find_clusters(review_ids.to_numpy(), signatures)
+            with self.lock:
+                self.signatures = pd.DataFrame(signatures, index=review_ids)
+                self.clusters[version] = clusters
+                while len(self.clusters) > MAX_VERSIONS:
+                    self.clusters.popitem(last=False)
+
+
+@st.cache_resource(show_spinner=False)
+def get_duplicate_detector(table_name):
+    return DuplicateDetector()
+
+
+def duplicate_clusters(table_name, reviews_data, version):
+    return get_duplicate_detector(table_name).get(reviews_data, version)
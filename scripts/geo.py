@@ -0,0 +1,132 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+
+from scripts.sapi import data_version
+
+EARTH_RADIUS_KM = 6371.0088
+CELL_DEGREES = 0.25
+
+
+def haversine_km(lat, lon, lats, lons):
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class SpatialIndex:
+    # Locations bucketed into a fixed lat/long grid with the cell keys sorted, so a query only
+    # computes exact haversine distances for the locations in the grid cells its area touches.
+    def __init__(self, places, cell_degrees=CELL_DEGREES):
+        places = places.dropna(subset=['LATITUDE', 'LONGITUDE']).drop_duplicates('PLACE_ID')
+        self.cell_degrees = cell_degrees
+        self.columns = int(np.ceil(360 / cell_degrees))
+        self.rows = int(np.ceil(180 / cell_degrees))
+        keys = self.cell_keys(places['LATITUDE'].to_numpy(float), places['LONGITUDE'].to_numpy(float))
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.place_ids = places['PLACE_ID'].to_numpy()[order]
+        self.lats = places['LATITUDE'].to_numpy(float)[order]
+        self.lons = places['LONGITUDE'].to_numpy(float)[order]
+        self.positions = pd.Index(self.place_ids)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def cell_row(self, lat):
+        return np.clip(((np.asarray(lat) + 90) // self.cell_degrees).astype(int), 0, self.rows - 1)
+
+    def cell_column(self, lon):
+        return ((np.asarray(lon) + 180) // self.cell_degrees).astype(int) % self.columns
+
+    def cell_keys(self, lats, lons):
+        return self.cell_row(lats) * self.columns + self.cell_column(lons)
+
+    def candidates(self, south, west, north, east):
+        # Positions of the locations in the cells overlapping the box, a west > east box crosses the antimeridian.
+        if west <= east and east - west >= 360:
+            column_ranges = [(0, self.columns - 1)]
+        elif west <= east:
+            column_ranges = [(int(self.cell_column(west)), int(self.cell_column(east)))]
+        else:
+            column_ranges = [(int(self.cell_column(west)), self.columns - 1), (0, int(self.cell_column(east)))]
+        if any(first > last for first, last in column_ranges):
+            column_ranges = [(0, self.columns - 1)]
+        rows = np.arange(self.cell_row(south), self.cell_row(north) + 1)
+        starts = np.concatenate([rows * self.columns + first for first, _ in column_ranges])
+        ends = np.concatenate([rows * self.columns + last for _, last in column_ranges])
+        lower = np.searchsorted(self.keys, starts, side='left')
+        upper = np.searchsorted(self.keys, ends, side='right')
+        if len(lower) == 0 or (upper - lower).sum() == 0:
+            return np.array([], dtype=int)
+        return np.concatenate([np.arange(first, last) for first, last in zip(lower, upper) if last > first])
+
+    def within(self, lat, lon, radius_km):
+        # Returns (place_ids, distances_km) of the locations within radius_km, closest first.
+        lat_delta = np.degrees(radius_km / EARTH_RADIUS_KM)
+        south, north = max(lat - lat_delta, -90.0), min(lat + lat_delta, 90.0)
+        widest = np.cos(np.radians(max(abs(south), abs(north))))
+        lon_delta = 360.0 if widest < 1e-6 or north >= 90 or south <= -90 else min(lat_delta / widest, 180.0)
+        west, east = ((lon - lon_delta + 180) % 360) - 180, ((lon + lon_delta + 180) % 360) - 180
+        positions = self.candidates(south, west if lon_delta < 180 else -180.0, north, east if lon_delta < 180 else 180.0)
+        distances = haversine_km(lat, lon, self.lats[positions], self.lons[positions])
+        inside = distances <= radius_km
+        positions, distances = positions[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return self.place_ids[positions[order]], distances[order]
+
+    def in_viewport(self, south, west, north, east):
+        positions = self.candidates(south, west, north, east)
+        lats, lons = self.lats[positions], self.lons[positions]
+        inside = (lats >= south) & (lats <= north)
+        inside &= ((lons >= west) & (lons <= east)) if west <= east else ((lons >= west) | (lons <= east))
+        return self.place_ids[positions[inside]]
+
+    def nearest(self, lat, lon, k=5, exclude=()):
+        # The search radius doubles until it holds k locations, which are then exactly the k nearest.
+        radius_km = EARTH_RADIUS_KM * np.radians(self.cell_degrees)
+        wanted = min(k, len(self) - len(exclude))
+        while True:
+            place_ids, distances = self.within(lat, lon, radius_km)
+            keep = ~pd.Index(place_ids).isin(list(exclude))
+            place_ids, distances = place_ids[keep], distances[keep]
+            if len(place_ids) >= wanted or radius_km >= np.pi * EARTH_RADIUS_KM:
+                return place_ids[:k], distances[:k]
+            radius_km *= 2
+
+    def location(self, place_id):
+        position = self.positions.get_loc(place_id)
+        return self.lats[position], self.lons[position]
+
+
+def densest_point(lats, lons, weights=None, cell_degrees=CELL_DEGREES):
+    # Weighted center of the grid cell holding most of the locations, the map opens there.
+    lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+    if len(lats) == 0:
+        return None
+    weights = np.ones(len(lats)) if weights is None else np.asarray(weights, dtype=float)
+    cells = (lats // cell_degrees) * 10000 + lons // cell_degrees
+    _, inverse = np.unique(cells, return_inverse=True)
+    in_cell = inverse == np.bincount(inverse, weights=weights).argmax()
+    return np.average(lats[in_cell], weights=weights[in_cell]), np.average(lons[in_cell], weights=weights[in_cell])
+
+
+@st.cache_resource(show_spinner=False)
+def _spatial_index(_places, version):
+    return SpatialIndex(_places)
+
+
+def spatial_index(places):
+    # Built once per version of the locations table.
+    version = data_version(places)
+    if version is None:
+        return SpatialIndex(places)
+    return _spatial_index(places, version)
+
+
+def nearest_locations(places, place_id, k=10):
+    # The k locations closest to place_id with their distance, e.g. the nearest competitors of a store.
+    index = spatial_index(places)
+    place_ids, distances = index.nearest(*index.location(place_id), k=k, exclude=[place_id])
+    nearest = pd.DataFrame({'PLACE_ID': place_ids, 'DISTANCE_KM': distances.round(1)})
+    return nearest.merge(places.drop_duplicates('PLACE_ID'), on='PLACE_ID', how='left')
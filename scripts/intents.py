@@ -0,0 +1,198 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import re
+import threading
+import time
+
+DIMENSIONS = {
+    'city': 'CITY', 'cities': 'CITY',
+    'location': 'ADDRESS', 'locations': 'ADDRESS', 'store': 'ADDRESS', 'stores': 'ADDRESS',
+    'shop': 'ADDRESS', 'shops': 'ADDRESS', 'address': 'ADDRESS',
+    'state': 'COUNTRY_CODE', 'states': 'COUNTRY_CODE', 'country': 'COUNTRY_CODE', 'countries': 'COUNTRY_CODE',
+    'category': 'CATEGORY', 'categories': 'CATEGORY',
+    'sentiment': 'SENTIMENT', 'rating': 'RATING', 'ratings': 'RATING',
+    'month': 'MONTH', 'months': 'MONTH', 'week': 'WEEK', 'weeks': 'WEEK', 'day': 'DAY', 'days': 'DAY', 'date': 'DAY'
+}
+LABELS = {
+    'CITY': 'City', 'ADDRESS': 'Location', 'COUNTRY_CODE': 'State', 'CATEGORY': 'Category', 'SENTIMENT': 'Sentiment',
+    'RATING': 'Rating', 'MONTH': 'Month', 'WEEK': 'Week', 'DAY': 'Date'
+}
+PLURAL_LABELS = {'CITY': 'cities', 'ADDRESS': 'locations'}
+PERIODS = {
+    'week': pd.DateOffset(weeks=1), 'month': pd.DateOffset(months=1), '3 months': pd.DateOffset(months=3),
+    'quarter': pd.DateOffset(months=3), 'year': pd.DateOffset(years=1), '12 months': pd.DateOffset(years=1)
+}
+DIMENSION_PATTERN = '|'.join(sorted(map(re.escape, DIMENSIONS), key=len, reverse=True))
+PERIOD_PATTERN = r'(?:last|past|previous)\s+(3 months|12 months|week|month|quarter|year)'
+MIN_REVIEWS = 5
+
+# Questions are matched as a whole, after the time window and the polite lead-in are stripped, so any
+# qualifier the catalog doesn't know (a keyword filter, "to open a new store", ...) goes to the assistant.
+LEAD_IN = re.compile(r"^(?:please\s+)?(?:(?:show|give|tell)(?:\s+me)?|what(?:'s|\s+is|\s+are|\s+was|\s+were)|which\s+(?:is|are)|list|plot|compare)?\s*(?:the\s+)?")
+PERIOD_PHRASE = re.compile(rf'\s*\b(?:(?:in|for|over|during)\s+)?(?:the\s+)?{PERIOD_PATTERN}\b')
+GROUP_BY = r'(?:per|by|for each|in each|each|across)'
+AVERAGE_RATING = re.compile(rf'(?:average|avg|mean)\s+(?:review\s+)?ratings?\s+{GROUP_BY}\s+({DIMENSION_PATTERN})')
+REVIEW_COUNT = re.compile(
+    rf'(?:how many|number of|count of|count)\s+(?:the\s+)?reviews?(?:\s+(?:are there|do we have|did we get))?\s+{GROUP_BY}\s+({DIMENSION_PATTERN})'
+    rf'|review counts?\s+{GROUP_BY}\s+({DIMENSION_PATTERN})'
+)
+RANKED_LOCATIONS = re.compile(
+    r'(?:(\d+)\s+)?(worst|best|lowest|highest|top|bottom)(?:\s+(\d+))?(?:\s+rated)?\s+(locations?|stores?|shops?|cities|city)'
+    r'(?:\s+by\s+(?:average\s+)?rating)?'
+)
+SENTIMENT_SHARE = re.compile(rf'sentiment\s+(?:distribution|breakdown|split|share)(?:\s+{GROUP_BY}\s+({DIMENSION_PATTERN}))?')
+RATING_TREND = re.compile(r'(?:average\s+)?ratings?\s+(?:trend|over time|development)|trend\s+of\s+(?:the\s+)?(?:average\s+)?ratings?')
+
+
+@st.cache_resource(show_spinner=False)
+def get_router_stats():
+    return {'questions': 0, 'hits': 0, 'local_seconds': 0.0, 'remote_runs': 0, 'remote_seconds': 0.0, 'lock': threading.Lock()}
+
+
+def record_local(hit, seconds):
+    stats = get_router_stats()
+    with stats['lock']:
+        stats['questions'] += 1
+        if hit:
+            stats['hits'] += 1
+            stats['local_seconds'] += seconds
+
+
+def record_remote(seconds):
+    stats = get_router_stats()
+    with stats['lock']:
+        stats['remote_runs'] += 1
+        stats['remote_seconds'] += seconds
+
+
+def router_summary():
+    stats = get_router_stats()
+    if stats['questions'] == 0:
+        return None
+    hit_rate = stats['hits'] / stats['questions']
+    summary = f"⚡ {stats['hits']:,} of {stats['questions']:,} questions answered locally ({hit_rate:.0%})"
+    if stats['remote_runs'] > 0 and stats['hits'] > 0:
+        average_run = stats['remote_seconds'] / stats['remote_runs']
+        saved = stats['hits'] * average_run - stats['local_seconds']
+        summary += f", ~{saved:,.0f}s saved (avg. assistant run {average_run:.1f}s)"
+    return summary
+
+
+def time_window(prompt, data):
+    match = re.search(PERIOD_PATTERN, prompt)
+    if match is None:
+        return data, ''
+    end_date = pd.to_datetime('today')
+    start_date = end_date - PERIODS[match.group(1)]
+    dates = pd.to_datetime(data['REVIEW_DATE'])
+    return data[dates.between(start_date, end_date)], f" in the last {match.group(1)}"
+
+
+def with_dimension(data, dimension):
+    if dimension in ('MONTH', 'WEEK', 'DAY'):
+        frequency = {'MONTH': 'M', 'WEEK': 'W', 'DAY': 'D'}[dimension]
+        period = pd.to_datetime(data['REVIEW_DATE']).dt.to_period(frequency).dt.start_time
+        return data.assign(**{dimension: period})
+    return data
+
+
+def bar_chart(table, x, y, title, orientation='v'):
+    fig = px.bar(table, x=x if orientation == 'v' else y, y=y if orientation == 'v' else x, orientation=orientation,
+                 title=title, labels=LABELS, color_discrete_sequence=['#238dff'])
+    fig.update_layout(xaxis_title=None, yaxis_title=None)
+    return fig
+
+
+def average_rating(data, dimension, period):
+    data = with_dimension(data, dimension)
+    table = (
+        data.groupby(dimension)
+        .agg(AVG_RATING=('RATING', 'mean'), REVIEWS=('RATING', 'size'))
+        .round({'AVG_RATING': 2})
+        .reset_index()
+    )
+    title = f"Average rating per {LABELS[dimension].lower()}{period}"
+    if dimension in ('MONTH', 'WEEK', 'DAY'):
+        fig = px.line(table, x=dimension, y='AVG_RATING', title=title, labels=LABELS, markers=True)
+        fig.update_layout(xaxis_title=None, yaxis_title=None)
+    else:
+        table = table.sort_values('AVG_RATING', ascending=False)
+        fig = bar_chart(table.head(30), dimension, 'AVG_RATING', title)
+    return title, table, fig
+
+
+def review_count(data, dimension, period):
+    data = with_dimension(data, dimension)
+    table = data.groupby(dimension).size().reset_index(name='REVIEWS')
+    if dimension not in ('MONTH', 'WEEK', 'DAY', 'RATING'):
+        table = table.sort_values('REVIEWS', ascending=False)
+    title = f"Number of reviews per {LABELS[dimension].lower()}{period}"
+    return title, table, bar_chart(table.head(30), dimension, 'REVIEWS', title)
+
+
+def ranked_locations(data, direction, count, unit, period):
+    dimension = 'CITY' if unit.startswith('cit') else 'ADDRESS'
+    ascending = direction in ('worst', 'lowest', 'bottom')
+    table = (
+        data.groupby(dimension)
+        .agg(AVG_RATING=('RATING', 'mean'), REVIEWS=('RATING', 'size'))
+        .loc[lambda table: table['REVIEWS'] >= MIN_REVIEWS]
+        .round({'AVG_RATING': 2})
+        .sort_values(['AVG_RATING', 'REVIEWS'], ascending=[ascending, False])
+        .head(count)
+        .reset_index()
+    )
+    title = f"{direction.capitalize()} {count} {PLURAL_LABELS[dimension]} by average rating{period} (min. {MIN_REVIEWS} reviews)"
+    return title, table, bar_chart(table.iloc[::-1], dimension, 'AVG_RATING', title, orientation='h')
+
+
+def sentiment_share(data, dimension, period):
+    if dimension is None:
+        table = data['SENTIMENT'].value_counts().rename_axis('SENTIMENT').reset_index(name='REVIEWS')
+        title = f"Sentiment distribution{period}"
+        fig = px.pie(table, names='SENTIMENT', values='REVIEWS', title=title, hole=0.3, color='SENTIMENT',
+                     color_discrete_map={'Negative': '#EA4335', 'Mixed': '#FBBC05', 'Unknown': '#B3B3B3', 'Positive': '#34A853'})
+        return title, table, fig
+    data = with_dimension(data, dimension)
+    table = pd.crosstab(data[dimension], data['SENTIMENT'], normalize='index').round(3).reset_index()
+    title = f"Sentiment distribution per {LABELS[dimension].lower()}{period}"
+    fig = px.bar(table.head(30), x=dimension, y=[c for c in table.columns if c != dimension], title=title, labels=LABELS,
+                 color_discrete_map={'Negative': '#EA4335', 'Mixed': '#FBBC05', 'Unknown': '#B3B3B3', 'Positive': '#34A853'})
+    fig.update_layout(xaxis_title=None, yaxis_title=None, yaxis_tickformat='.0%', legend_title_text=None)
+    return title, table, fig
+
+
+def question_text(prompt):
+    text = re.sub(r'\s+', ' ', prompt.lower()).strip().rstrip('?.! ')
+    return LEAD_IN.sub('', PERIOD_PHRASE.sub('', text), count=1).strip()
+
+
+def route(prompt, data):
+    # Returns (title, table, figure) for questions from the catalog, None for everything else.
+    text = question_text(prompt)
+    period_data, period = time_window(prompt.lower(), data)
+
+    if match := AVERAGE_RATING.fullmatch(text):
+        return average_rating(period_data, DIMENSIONS[match.group(1)], period)
+    if match := REVIEW_COUNT.fullmatch(text):
+        return review_count(period_data, DIMENSIONS[match.group(1) or match.group(2)], period)
+    if match := RANKED_LOCATIONS.fullmatch(text):
+        if match.group(1) and match.group(3):
+            return None
+        return ranked_locations(period_data, match.group(2), int(match.group(1) or match.group(3) or 10), match.group(4), period)
+    if match := SENTIMENT_SHARE.fullmatch(text):
+        return sentiment_share(period_data, DIMENSIONS.get(match.group(1)) if match.group(1) else None, period)
+    if RATING_TREND.fullmatch(text):
+        return average_rating(period_data, 'MONTH', period)
+    return None
+
+
+def answer_locally(prompt, data):
+    start = time.perf_counter()
+    try:
+        result = route(prompt, data) if data is not None and not data.empty else None
+    except (KeyError, ValueError):
+        result = None
+    record_local(result is not None, time.perf_counter() - start)
+    return result
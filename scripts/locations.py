@@ -2,6 +2,9 @@ import streamlit as st
 import pandas as pd
 import pydeck as pdk
 
+from scripts.memo import memoize
+from scripts.geo import densest_point
+
 def get_color(rating):
     if rating <= 1:
         return [234, 67, 53, 255]
@@ -14,29 +17,35 @@ def get_color(rating):
     else:
         return [52, 168, 83, 255]
 
-def locations(data):
+def location_map_data(data):
     map_data = data.groupby(['ADDRESS', 'LATITUDE', 'LONGITUDE', 'COUNTRY_CODE', 'PLACE_TOTAL_SCORE']).agg({
         'REVIEW_ID': 'count',
         'RATING': 'mean'
     }).reset_index().rename(columns={'REVIEW_ID': 'COUNT'})
+    map_data['RATING'] = map_data['RATING'].round(2)
+    map_data['color'] = map_data['RATING'].apply(get_color)
+    return map_data
+
+def locations(data, signature=None, anomalies=None, anchor=None, competitors=None):
+    map_data = memoize(signature, 'map_data', lambda: location_map_data(data))
     if map_data.empty:
         st.info("No map data available.", icon=':material/info:')
         st.stop()
-    
-    map_data['RATING'] = map_data['RATING'].round(2)
-    state_reviews = map_data.groupby('COUNTRY_CODE')['COUNT'].sum().reset_index()
-    state_reviews = state_reviews.sort_values('COUNT', ascending=False)
-    state_with_most_reviews = state_reviews.iloc[0]['COUNTRY_CODE']
-    state_coords = map_data[map_data['COUNTRY_CODE'] == state_with_most_reviews].agg({
-        'LATITUDE': 'mean',
-        'LONGITUDE': 'mean'
-    })
 
-    center_lat = state_coords['LATITUDE']
-    center_long = state_coords['LONGITUDE']
-
-    map_data['color'] = map_data['RATING'].apply(get_color)
+    alert_addresses = []
+    if anomalies is not None and not anomalies.empty:
+        alerts = data[['PLACE_ID', 'ADDRESS']].drop_duplicates().merge(anomalies[['PLACE_ID', 'ALERT']], on='PLACE_ID')
+        alert_addresses = alerts['ADDRESS'].tolist()
+        map_data = map_data.merge(alerts[['ADDRESS', 'ALERT']].drop_duplicates('ADDRESS'), on='ADDRESS', how='left')
+        map_data['ALERT'] = ('⚠️ ' + map_data['ALERT']).fillna('')
+    else:
+        map_data = map_data.assign(ALERT='')
     
+    if anchor is not None:
+        center_lat, center_long = anchor
+    else:
+        center_lat, center_long = memoize(signature, 'map_center', lambda: densest_point(map_data['LATITUDE'], map_data['LONGITUDE'], map_data['COUNT']))
+
     column_layer = pdk.Layer(
         "ColumnLayer",
         data=map_data,
@@ -49,6 +58,18 @@ def locations(data):
         pickable=True
     )
 
+    # Flagged locations get a red ring around their column.
+    alert_layer = pdk.Layer(
+        "ScatterplotLayer",
+        data=map_data[map_data['ADDRESS'].isin(alert_addresses)],
+        get_position=["LONGITUDE", "LATITUDE"],
+        get_radius=2000,
+        stroked=True,
+        filled=False,
+        line_width_min_pixels=3,
+        get_line_color=[234, 67, 53, 255]
+    )
+
     view_state = pdk.ViewState(
         latitude=center_lat,
         longitude=center_long,
@@ -59,9 +80,9 @@ def locations(data):
     deck = pdk.Deck(
         initial_view_state=view_state,
         map_style=None,
-        layers=[column_layer],
+        layers=[column_layer, alert_layer],
         tooltip={
-            "text": "Location: {ADDRESS}\nLocation Rating: {PLACE_TOTAL_SCORE}\nCollected Reviews: {COUNT}\nAvg Review Rating: {RATING}",
+            "text": "Location: {ADDRESS}\nLocation Rating: {PLACE_TOTAL_SCORE}\nCollected Reviews: {COUNT}\nAvg Review Rating: {RATING}\n{ALERT}",
             "style": {
                 "backgroundColor": "white",
                 "color": "black",
@@ -71,3 +92,21 @@ def locations(data):
     )
     st.pydeck_chart(deck, use_container_width=True, height=700)
     st.caption("_The height of the column represents the number of collected reviews, the color represents the average rating._")
+    if alert_addresses:
+        st.caption(f"_⚠️ {len(alert_addresses)} location(s) circled in red show a significant drop in recent ratings, see the Overview for details._")
+
+    if competitors is not None and not competitors.empty:
+        st.markdown("##### Nearest Locations")
+        st.dataframe(
+            competitors,
+            column_order=('DISTANCE_KM', 'ADDRESS', 'CATEGORY', 'CITY', 'PLACE_TOTAL_SCORE', 'PLACE_URL'),
+            column_config={
+                "DISTANCE_KM": st.column_config.NumberColumn("Distance", format="%.1f km", width="small"),
+                "ADDRESS": st.column_config.Column("Location", width="large"),
+                "CATEGORY": "Category",
+                "CITY": "City",
+                "PLACE_TOTAL_SCORE": st.column_config.NumberColumn("Location Rating", format="⭐️ %.1f"),
+                "PLACE_URL": st.column_config.LinkColumn('🔗', width='small', display_text='URL')
+            },
+            hide_index=True,
+            use_container_width=True)
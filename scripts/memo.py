@@ -0,0 +1,117 @@
+import streamlit as st
+import pandas as pd
+import hashlib
+import json
+import sys
+import threading
+
+from collections import OrderedDict
+
+MAX_CACHE_BYTES = 512 * 1024 ** 2
+MAX_CACHE_ENTRIES = 500
+
+
+def normalize(value):
+    if isinstance(value, (list, tuple, set, pd.Index, pd.Series)):
+        items = [normalize(item) for item in value]
+        return sorted(items, key=str) if isinstance(value, (set, list, pd.Index, pd.Series)) else items
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def filter_signature(**selections):
+    # Canonical hash of the sidebar selection and data version, identical selections give identical keys.
+    canonical = json.dumps({key: normalize(value) for key, value in selections.items()}, sort_keys=True, default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def size_of(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(size_of(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class FrameCache:
+    # LRU of derived frames and serialized figures, bounded by entry count and estimated memory.
+    # Values are shared by all sessions and must not be mutated by the caller.
+    def __init__(self, max_bytes=MAX_CACHE_BYTES, max_entries=MAX_CACHE_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, self.entries[key][0]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        size = size_of(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes or len(self.entries) > self.max_entries:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def stats(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_frame_cache():
+    return FrameCache()
+
+
+def memoize(signature, name, compute):
+    if signature is None:
+        return compute()
+    cache = get_frame_cache()
+    key = (signature, name)
+    found, value = cache.get(key)
+    if not found:
+        value = compute()
+        cache.put(key, value)
+    return value
+
+
+def memoize_figure(signature, name, build):
+    # Figures are cached as Plotly JSON, so a hit skips building the traces.
+    if signature is None:
+        return build()
+    import plotly.io as pio
+    return pio.from_json(memoize(signature, name, lambda: build().to_json()))
+
+
+def cache_summary():
+    stats = get_frame_cache().stats()
+    return (f"**Cache:** {stats['hit_rate']:.0%} hit rate, {stats['entries']:,} entries, "
+            f"{stats['bytes'] / 1024 ** 2:,.0f} MB.")
@@ -0,0 +1,252 @@
+# Local OpenAI-compatible server for testing latency and failure handling offline.
+#
+#   python -m scripts.mock_openai --port 8001 --latency 2 --failure-rate 0.2 --rate-limit-rate 0.1
+#   python -m scripts.mock_openai --run-duration 400
+#
+# Point the app at it with OPENAI_BASE_URL = "http://localhost:8001/v1" in .streamlit/secrets.toml.
+# Implements chat completions, the model list and the Assistants path used by the app: file uploads,
+# threads, messages and runs. Runs complete after --run-duration seconds with a canned answer.
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+def chat_completion(request):
+    prompt = request.get('messages', [{}])[-1].get('content', '')
+    return {
+        'id': f'chatcmpl-{uuid.uuid4().hex}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': request.get('model', 'mock'),
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': f'Mock response to: {prompt[:200]}'},
+            'finish_reason': 'stop'
+        }],
+        'usage': {'prompt_tokens': len(prompt.split()), 'completion_tokens': 5, 'total_tokens': len(prompt.split()) + 5}
+    }
+
+
+class AssistantsState:
+    # In-memory files, threads, messages and runs, shared by the request threads.
+    def __init__(self, run_duration):
+        self.run_duration = run_duration
+        self.files = {}
+        self.threads = {}
+        self.messages = {}
+        self.runs = {}
+        self.lock = threading.RLock()
+
+    def create_file(self, filename, purpose, size):
+        file = {'id': f'file-{uuid.uuid4().hex}', 'object': 'file', 'bytes': size, 'created_at': int(time.time()),
+                'filename': filename, 'purpose': purpose, 'status': 'processed'}
+        with self.lock:
+            self.files[file['id']] = file
+        return file
+
+    def list_files(self, purpose=None):
+        with self.lock:
+            return [file for file in self.files.values() if purpose is None or file['purpose'] == purpose]
+
+    def delete_file(self, file_id):
+        with self.lock:
+            return self.files.pop(file_id, None) is not None
+
+    def create_thread(self, messages):
+        thread = {'id': f'thread_{uuid.uuid4().hex}', 'object': 'thread', 'created_at': int(time.time()),
+                  'metadata': {}, 'tool_resources': {}}
+        with self.lock:
+            self.threads[thread['id']] = thread
+            self.messages[thread['id']] = []
+        for message in messages:
+            self.add_message(thread['id'], message.get('role', 'user'), message.get('content', ''), message.get('attachments'))
+        return thread
+
+    def add_message(self, thread_id, role, content, attachments=None, run_id=None, assistant_id=None):
+        if isinstance(content, list):
+            content = ' '.join(part.get('text', '') for part in content if isinstance(part, dict))
+        message = {'id': f'msg_{uuid.uuid4().hex}', 'object': 'thread.message', 'created_at': int(time.time()),
+                   'thread_id': thread_id, 'role': role, 'status': 'completed', 'assistant_id': assistant_id,
+                   'run_id': run_id, 'attachments': attachments or [], 'metadata': {},
+                   'content': [{'type': 'text', 'text': {'value': content, 'annotations': []}}]}
+        with self.lock:
+            if thread_id not in self.messages:
+                return None
+            self.messages[thread_id].append(message)
+        return message
+
+    def list_messages(self, thread_id):
+        with self.lock:
+            messages = self.messages.get(thread_id)
+            return None if messages is None else list(reversed(messages))
+
+    def create_run(self, thread_id, assistant_id):
+        run = {'id': f'run_{uuid.uuid4().hex}', 'object': 'thread.run', 'created_at': int(time.time()),
+               'thread_id': thread_id, 'assistant_id': assistant_id, 'status': 'queued', 'model': 'gpt-4o',
+               'instructions': '', 'tools': [], 'metadata': {}, 'started_at': None, 'completed_at': None,
+               'cancelled_at': None, 'failed_at': None, 'expires_at': None, 'last_error': None}
+        with self.lock:
+            if thread_id not in self.threads:
+                return None
+            self.runs[run['id']] = dict(run, started=time.monotonic())
+        return run
+
+    def retrieve_run(self, thread_id, run_id, cancel=False):
+        # Runs move from queued to in_progress to completed as time passes, the answer is added on completion.
+        with self.lock:
+            run = self.runs.get(run_id)
+            if run is None or run['thread_id'] != thread_id:
+                return None
+            elapsed = time.monotonic() - run['started']
+            if run['status'] in ('queued', 'in_progress'):
+                if cancel:
+                    run.update(status='cancelled', cancelled_at=int(time.time()))
+                elif elapsed >= self.run_duration:
+                    run.update(status='completed', completed_at=int(time.time()))
+                    prompt = next((message['content'][0]['text']['value'] for message in reversed(self.messages[thread_id])
+                                   if message['role'] == 'user'), '')
+                    self.add_message(thread_id, 'assistant', f'Mock analysis of: {prompt[-200:]}',
+                                     run_id=run_id, assistant_id=run['assistant_id'])
+                elif elapsed > 0:
+                    run.update(status='in_progress', started_at=run['started_at'] or int(time.time()))
+            return {key: value for key, value in run.items() if key != 'started'}
+
+
+def uploaded_file(body):
+    # Filename, purpose and size of a multipart/form-data file upload.
+    filename = re.search(rb'name="file"; filename="([^"]*)"', body)
+    purpose = re.search(rb'name="purpose"\r\n\r\n([^\r]*)', body)
+    return (filename.group(1).decode('utf-8') if filename else 'upload',
+            purpose.group(1).decode('utf-8') if purpose else 'assistants',
+            len(body))
+
+
+def list_body(data):
+    return {'object': 'list', 'data': data, 'first_id': data[0]['id'] if data else None,
+            'last_id': data[-1]['id'] if data else None, 'has_more': False}
+
+
+def make_handler(config):
+    state = AssistantsState(config.run_duration)
+
+    class MockOpenAIHandler(BaseHTTPRequestHandler):
+        def send_json(self, status, body, headers=None):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def simulate(self):
+            time.sleep(max(0.0, random.gauss(config.latency, config.jitter)))
+            roll = random.random()
+            if roll < config.rate_limit_rate:
+                self.send_json(429, {'error': {'message': 'Rate limit reached (mock).', 'type': 'requests'}},
+                               headers={'Retry-After': str(config.retry_after)})
+                return False
+            if roll < config.rate_limit_rate + config.failure_rate:
+                self.send_json(config.failure_status, {'error': {'message': 'Upstream failure (mock).', 'type': 'server_error'}})
+                return False
+            return True
+
+        def not_found(self):
+            self.send_json(404, {'error': {'message': f'Unknown path {self.path}', 'type': 'invalid_request_error'}})
+
+        def send_found(self, body):
+            if body is None:
+                self.not_found()
+            else:
+                self.send_json(200, body)
+
+        def do_GET(self):
+            path, _, query = self.path.partition('?')
+            parts = path.strip('/').split('/')
+            if parts == ['v1', 'models']:
+                self.send_json(200, {'object': 'list', 'data': [{'id': 'gpt-4o', 'object': 'model', 'owned_by': 'mock'}]})
+            elif parts == ['v1', 'files']:
+                purpose = dict(item.partition('=')[::2] for item in query.split('&') if item).get('purpose')
+                self.send_json(200, list_body(state.list_files(purpose)))
+            elif len(parts) == 4 and parts[:2] == ['v1', 'threads'] and parts[3] == 'messages':
+                messages = state.list_messages(parts[2])
+                self.send_found(None if messages is None else list_body(messages))
+            elif len(parts) == 5 and parts[:2] == ['v1', 'threads'] and parts[3] == 'runs':
+                self.send_found(state.retrieve_run(parts[2], parts[4]))
+            else:
+                self.not_found()
+
+        def do_DELETE(self):
+            parts = self.path.strip('/').split('/')
+            if len(parts) == 3 and parts[:2] == ['v1', 'files'] and state.delete_file(parts[2]):
+                self.send_json(200, {'id': parts[2], 'object': 'file', 'deleted': True})
+            else:
+                self.not_found()
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length)
+            parts = self.path.split('?')[0].strip('/').split('/')
+            if parts == ['v1', 'files']:
+                if self.simulate():
+                    self.send_json(200, state.create_file(*uploaded_file(body)))
+                return
+            request = json.loads(body or b'{}')
+            if parts == ['v1', 'chat', 'completions']:
+                if self.simulate():
+                    self.send_json(200, chat_completion(request))
+            elif parts == ['v1', 'threads']:
+                if self.simulate():
+                    self.send_json(200, state.create_thread(request.get('messages') or []))
+            elif len(parts) == 4 and parts[:2] == ['v1', 'threads'] and parts[3] == 'messages':
+                if self.simulate():
+                    self.send_found(state.add_message(parts[2], request.get('role', 'user'), request.get('content', ''),
+                                                      request.get('attachments')))
+            elif len(parts) == 4 and parts[:2] == ['v1', 'threads'] and parts[3] == 'runs':
+                if self.simulate():
+                    self.send_found(state.create_run(parts[2], request.get('assistant_id')))
+            elif len(parts) == 6 and parts[:2] == ['v1', 'threads'] and parts[3] == 'runs' and parts[5] == 'cancel':
+                self.send_found(state.retrieve_run(parts[2], parts[4], cancel=True))
+            else:
+                self.not_found()
+
+        def log_message(self, format, *args):
+            if not config.quiet:
+                super().log_message(format, *args)
+
+    return MockOpenAIHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock OpenAI-compatible server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.5, help='mean response latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.1, help='standard deviation of the latency in seconds')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of requests failing with --failure-status')
+    parser.add_argument('--failure-status', type=int, default=503)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='share of requests rejected with 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After header sent with 429 responses')
+    parser.add_argument('--run-duration', type=float, default=5.0, help='seconds until an assistant run completes')
+    parser.add_argument('--quiet', action='store_true')
+    config = parser.parse_args()
+
+    server = ThreadingHTTPServer((config.host, config.port), make_handler(config))
+    print(f'Mock OpenAI server listening on http://{config.host}:{config.port}/v1')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,41 @@
 import streamlit as st
 import pandas as pd
 import datetime
+import hashlib
 import os
+import threading
+import time
+import weakref
 
 from PIL import Image
 from io import BytesIO
-from openai import OpenAI
 from tempfile import gettempdir
 
 from scripts.sapi import write_table
+from scripts.openai_client import get_client, call_openai, CircuitOpenError
+from scripts.intents import answer_locally, record_remote, router_summary
 
-client = OpenAI(api_key=st.secrets['OPENAI_API_KEY'])
+RUN_TIMEOUT = 300
+RUN_POLL_INTERVAL = 1.0
+RUN_POLL_TIMEOUT = 30.0
+ACTIVE_RUN_STATUSES = ('queued', 'in_progress', 'cancelling')
+HISTORY_PAGE_SIZE = 10
+UPLOAD_PREFIX = 'reviews_'
+UPLOAD_TTL = 24 * 3600
+MAX_UPLOADS = 50
+CLEANUP_INTERVAL = 3600
+DATA_PAGE_SIZE = 100
+DATASET_COLUMNS = [
+    'REVIEW_ID', 'REVIEW_ORIGIN', 'PLACE_ID', 'CATEGORY', 'ADDRESS', 'CITY', 'COUNTRY_CODE', 'POSTAL_CODE',
+    'PLACE_TOTAL_SCORE', 'PLACE_REVIEWS_COUNT', 'LATITUDE', 'LONGITUDE', 'REVIEW_DATE', 'RATING',
+    'REVIEW_CONTEXT_MEAL_TYPE', 'REVIEW_CONTEXT_SERVICE', 'REVIEW_DETAILED_FOOD', 'REVIEW_DETAILED_SERVICE',
+    'REVIEW_DETAILED_ATMOSPHERE', 'REVIEW_TEXT', 'SENTIMENT', 'KEYWORDS', 'STATUS'
+]
 
 def generate_response(prompt):
     try:
-        completion = client.chat.completions.create(
+        completion = call_openai(
+            get_client().chat.completions.create,
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant."},
@@ -23,14 +44,213 @@ def generate_response(prompt):
             temperature=0.4
         )
         return completion.choices[0].message.content
+    except CircuitOpenError as e:
+        st.error(str(e))
+        return ''
     except Exception as e:
         st.error(f"An error occurred during content generation. Please try again.")
         return ''
 
 
-def assistant(file_id, assistant_id, bot_data):
+def parse_message(content):
+    # Split the "[Image: path]" markers out of a message once, when it is stored.
+    text, images = content, []
+    while "[Image:" in text:
+        start_index = text.find("[Image:")
+        end_index = text.find("]", start_index)
+        if end_index == -1:
+            break
+        images.append(text[start_index + len("[Image: "):end_index])
+        text = text[:start_index] + text[end_index + 1:]
+    return {"text": text, "images": images}
+
+
+def add_message(role, content, **extra):
+    st.session_state.messages.append({"role": role, "content": content, **parse_message(content), **extra})
+
+
+def render_message(message):
+    avatar = '🧑‍💻' if message["role"] == "user" else st.secrets['MINI_LOGO_URL']
+    if "text" not in message:
+        message.update(parse_message(message["content"]))
+    with st.chat_message(message["role"], avatar=avatar):
+        for image_path in message["images"]:
+            st.image(image_path)
+        st.markdown(message["text"])
+        render_local_answer(message)
+
+
+def render_local_answer(message):
+    # Keyed by message, the same question asked twice renders identical elements.
+    key = message.get("key")
+    if message.get("figure") is not None:
+        st.plotly_chart(message["figure"], use_container_width=True, key=key and f"{key}_figure")
+    if message.get("table") is not None:
+        st.dataframe(message["table"], hide_index=True, use_container_width=True, key=key and f"{key}_table")
+
+
+@st.fragment
+def chat_history():
+    # Only the latest messages are rendered, older ones are paged in on demand.
+    messages = st.session_state.messages
+    window = min(st.session_state.history_window, len(messages))
+    hidden = len(messages) - window
+    if hidden > 0:
+        if st.button(f"Show earlier messages ({hidden:,} hidden)", key="show_earlier_messages"):
+            st.session_state.history_window += HISTORY_PAGE_SIZE
+            st.rerun(scope="fragment")
+    for message in messages[hidden:]:
+        render_message(message)
+
+
+@st.fragment
+def data_preview(data):
+    page_count = max(1, -(-len(data) // DATA_PAGE_SIZE))
+    col1, col2 = st.columns([0.85, 0.15], vertical_alignment='center')
+    page = col2.number_input("Page", min_value=1, max_value=page_count, value=1, label_visibility='collapsed')
+    start = (page - 1) * DATA_PAGE_SIZE
+    col1.caption(f"_Rows {start + 1:,}–{min(start + DATA_PAGE_SIZE, len(data)):,} of {len(data):,} (page {page} of {page_count})._")
+    st.dataframe(data.iloc[start:start + DATA_PAGE_SIZE], hide_index=True)
+
+
+class SessionToken:
+    # Kept in session state and weakly referenced by the upload registry, so a closed session
+    # stops protecting the file it attached.
+    pass
+
+
+@st.cache_resource(show_spinner=False)
+def get_uploaded_datasets():
+    # Content hash -> (file_id, created_at), shared by all sessions so identical selections are uploaded once.
+    # The files are named after the hash, so the registry is rebuilt from the file list after a restart.
+    # 'used' holds the last time each file_id was handed to a run, 'attached' the file of every live session.
+    return {
+        'files': None, 'locks': {}, 'used': {}, 'attached': weakref.WeakKeyDictionary(), 'cleaned_at': 0.0,
+        'lock': threading.Lock(), 'list_lock': threading.Lock(),
+    }
+
+
+def upload_prefix():
+    # Files of other deployments sharing the OpenAI project are never listed or deleted.
+    tag = st.secrets.get('deployment_tag') or hashlib.sha256(st.secrets['ASSISTANT_ID'].encode('utf-8')).hexdigest()[:12]
+    return f'{UPLOAD_PREFIX}{tag}_'
+
+
+def uploaded_files(client):
+    prefix = upload_prefix()
+    files = {}
+    for file in call_openai(client.files.list, purpose='assistants'):
+        if file.filename.startswith(prefix) and file.filename.endswith('.parquet'):
+            files[file.filename[len(prefix):-len('.parquet')]] = (file.id, file.created_at)
+    return files
+
+
+def attach_upload(file_id):
+    registry = get_uploaded_datasets()
+    token = st.session_state.setdefault('upload_token', SessionToken())
+    with registry['lock']:
+        registry['attached'][token] = file_id
+
+
+def expired_uploads(registry):
+    # Drops uploads older than UPLOAD_TTL or beyond the MAX_UPLOADS newest from the registry, at most once
+    # per CLEANUP_INTERVAL, and returns their file_ids. Files attached by a live session, or created or
+    # used within RUN_TIMEOUT, may still be read by a run and are kept. Call with the registry lock held.
+    now = time.time()
+    if now - registry['cleaned_at'] < CLEANUP_INTERVAL:
+        return []
+    registry['cleaned_at'] = now
+    attached = set(registry['attached'].values())
+    newest_first = sorted(registry['files'].items(), key=lambda item: item[1][1], reverse=True)
+    expired = [
+        content_hash for position, (content_hash, (file_id, created_at)) in enumerate(newest_first)
+        if (position >= MAX_UPLOADS or now - created_at > UPLOAD_TTL)
+        and file_id not in attached
+        and now - max(created_at, registry['used'].get(file_id, 0)) > RUN_TIMEOUT
+    ]
+    for content_hash in expired:
+        registry['locks'].pop(content_hash, None)
+        registry['used'].pop(registry['files'][content_hash][0], None)
+    return [registry['files'].pop(content_hash)[0] for content_hash in expired]
+
+
+def project_dataset(data):
+    columns = [column for column in DATASET_COLUMNS if column in data.columns]
+    return data[columns].drop_duplicates('REVIEW_ID') if 'REVIEW_ID' in columns else data[columns]
+
+
+def dataset_hash(data):
+    digest = hashlib.sha256(','.join(data.columns).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def upload_dataset(data):
+    dataset = project_dataset(data)
+    content_hash = dataset_hash(dataset)
+    client = get_client()
+    registry = get_uploaded_datasets()
+    if registry['files'] is None:
+        # Listed once, without holding the registry lock other sessions need.
+        with registry['list_lock']:
+            if registry['files'] is None:
+                files = uploaded_files(client)
+                with registry['lock']:
+                    registry['files'] = files
+    with registry['lock']:
+        expired = expired_uploads(registry)
+        # Only concurrent uploads of the same selection wait for each other.
+        upload_lock = registry['locks'].setdefault(content_hash, threading.Lock())
+    for file_id in expired:
+        try:
+            call_openai(client.files.delete, file_id)
+        except Exception:
+            pass
+
+    with upload_lock:
+        with registry['lock']:
+            uploaded = registry['files'].get(content_hash)
+            if uploaded is not None:
+                registry['used'][uploaded[0]] = time.time()
+        if uploaded is None:
+            buffer = BytesIO()
+            dataset.to_parquet(buffer, index=False, compression='zstd')
+            file = call_openai(
+                client.files.create,
+                file=(f'{upload_prefix()}{content_hash}.parquet', buffer.getvalue()),
+                purpose='assistants',
+                idempotent=False,
+            )
+            uploaded = (file.id, file.created_at)
+            with registry['lock']:
+                registry['files'][content_hash] = uploaded
+        return uploaded[0], len(dataset)
+
+
+def wait_for_run(client, run, timeout=RUN_TIMEOUT):
+    # Polls until the run finishes or the overall deadline passes. Every poll is its own short
+    # request, so a long run doesn't hold one of the concurrent request slots in between.
+    deadline = time.monotonic() + timeout
+    while run.status in ACTIVE_RUN_STATUSES:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            try:
+                call_openai(client.beta.threads.runs.cancel, run.id, thread_id=run.thread_id, timeout=RUN_POLL_TIMEOUT)
+            except Exception:
+                pass
+            raise TimeoutError('The analysis took too long, please try again with a narrower question.')
+        time.sleep(min(RUN_POLL_INTERVAL, remaining))
+        run = call_openai(client.beta.threads.runs.retrieve, run.id, thread_id=run.thread_id,
+                          timeout=max(1.0, min(RUN_POLL_TIMEOUT, remaining)))
+    return run
+
+
+def assistant(file_id, assistant_id, bot_data, data=None):
+    client = get_client()
     if st.session_state.thread_id is None:
-        thread = client.beta.threads.create(
+        thread = call_openai(
+            client.beta.threads.create,
+            idempotent=False,
             messages=[
                 {
                     "role": "user",
@@ -73,27 +293,11 @@ def assistant(file_id, assistant_id, bot_data):
 #        st.session_state.table_written = True
 
     with st.expander("Data"):
-        st.dataframe(bot_data, hide_index=True)
+        data_preview(bot_data)
         #st.caption(f'Thread ID: {st.session_state.thread_id}')
 
-    for message in st.session_state.messages:
-        if message["role"] == "user":
-            avatar = '🧑‍💻'
-        else:
-            avatar = st.secrets['MINI_LOGO_URL']
-        
-        with st.chat_message(message["role"], avatar=avatar):
-            if "[Image:" in message["content"]:
-                start_index = message["content"].find("[Image:") + len("[Image: ")
-                end_index = message["content"].find("]", start_index)
-                image_path = message["content"][start_index:end_index]
-                st.image(image_path)
-                
-                text_content = message["content"][:start_index - len("[Image: ")] + message["content"][end_index + 1:]
-                st.markdown(text_content)
-            else:
-                st.markdown(message["content"])
-        placeholder = st.empty()
+    chat_history()
+    placeholder = st.empty()
     styl = f"""
         <style>
             .stTextInput {{
@@ -127,26 +331,73 @@ def assistant(file_id, assistant_id, bot_data):
     st.markdown(styl, unsafe_allow_html=True)
     st.markdown('<div class="spacer"></div>', unsafe_allow_html=True)  # Add the spacer div
 
+    use_selection = data is not None and st.toggle(
+        'Analyze the current filter selection',
+        key='use_filtered_dataset',
+        help='Uploads the reviews matching the sidebar filters as a compact Parquet file instead of using the full dataset.'
+    )
+
+    if summary := router_summary():
+        st.caption(summary)
+
     text_input = st.text_input("Query", placeholder="Your query", label_visibility='collapsed')
     if prompt := text_input:
         with placeholder.container():
-            st.session_state.messages.append({"role": "user", "content": prompt})
+            add_message("user", prompt)
             with st.chat_message("user", avatar='🧑‍💻'):
                 st.markdown(prompt)
 
+            # Templated analytical questions are answered from the in-memory data without an assistant run,
+            # over the same reviews the assistant would analyze.
+            scope_data, scope = (data, 'current filter selection') if use_selection else (bot_data, 'full dataset')
+            if local_answer := answer_locally(prompt, scope_data):
+                title, table, figure = local_answer
+                title = f"{title} ({scope})"
+                if table.empty:
+                    add_message("assistant", f"**{title}**\n\nNo matching reviews in the {scope}.")
+                else:
+                    add_message("assistant", f"**{title}**", table=table, figure=figure,
+                                key=f"local_answer_{len(st.session_state.messages)}")
+                render_message(st.session_state.messages[-1])
+                return
+
             with st.spinner('🤖 Analyzing, please wait...'):  
-                thread_message = client.beta.threads.messages.create(
-                    st.session_state.thread_id,
-                    role="user",
-                    content=prompt,
-                )
-                run = client.beta.threads.runs.create_and_poll(
-                    thread_id=st.session_state.thread_id,
-                    assistant_id=assistant_id,
-                )
+                try:
+                    run_started = time.perf_counter()
+                    content, attachments = prompt, []
+                    if use_selection:
+                        dataset_file_id, row_count = upload_dataset(data)
+                        if dataset_file_id != st.session_state.attached_file_id:
+                            attachments = [{"file_id": dataset_file_id, "tools": [{"type": "code_interpreter"}]}]
+                            st.session_state.attached_file_id = dataset_file_id
+                            attach_upload(dataset_file_id)
+                        content = (
+                            f"Use the attached Parquet file (file_id {dataset_file_id}, {row_count:,} reviews matching the "
+                            f"current dashboard filters, with a subset of the CSV columns) for this question.\n\n{prompt}"
+                        )
+                    thread_message = call_openai(
+                        client.beta.threads.messages.create,
+                        st.session_state.thread_id,
+                        role="user",
+                        content=content,
+                        attachments=attachments,
+                        idempotent=False,
+                    )
+                    run = call_openai(
+                        client.beta.threads.runs.create,
+                        thread_id=st.session_state.thread_id,
+                        assistant_id=assistant_id,
+                        idempotent=False,
+                    )
+                    run = wait_for_run(client, run)
+                except Exception as e:
+                    st.error(str(e) if isinstance(e, (CircuitOpenError, TimeoutError)) else "An error occurred during the analysis. Please try again.")
+                    return
 
             if run.status == 'completed':
-                messages = client.beta.threads.messages.list(
+                record_remote(time.perf_counter() - run_started)
+                messages = call_openai(
+                    client.beta.threads.messages.list,
                     thread_id=st.session_state.thread_id
                 )
                 newest_message = messages.data[0]
@@ -156,7 +407,7 @@ def assistant(file_id, assistant_id, bot_data):
                         if hasattr(message_content, "image_file"):
                             file_id = message_content.image_file.file_id
 
-                            resp = client.files.with_raw_response.retrieve_content(file_id)
+                            resp = call_openai(client.files.with_raw_response.retrieve_content, file_id)
 
                             if resp.status_code == 200:
                                 image_data = BytesIO(resp.content)
@@ -174,7 +425,7 @@ def assistant(file_id, assistant_id, bot_data):
                             st.markdown(text)
                             complete_message_content += text + "\n"
 
-                st.session_state.messages.append({"role": "assistant", "content": complete_message_content})
+                add_message("assistant", complete_message_content)
 
             else:
                 st.write(f"Run status: {run.status}")
\ No newline at end of file
@@ -0,0 +1,144 @@
+import streamlit as st
+import httpx
+import random
+import threading
+import time
+
+from openai import OpenAI, DefaultHttpxClient, APIConnectionError, APIStatusError, RateLimitError
+
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY = 30.0
+CONNECT_TIMEOUT = 5.0
+DEFAULT_TIMEOUT = 60.0
+MAX_CONCURRENT_REQUESTS = 8
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 20.0
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30.0
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # Opens after consecutive upstream failures and lets a single probe request through
+    # once the reset timeout has passed.
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if self.probing or time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError('OpenAI is temporarily unavailable, please try again in a moment.')
+            self.probing = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+@st.cache_resource(show_spinner=False)
+def get_client():
+    # One pooled client per process, retries are handled by call_openai instead of the SDK.
+    http_client = DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT)
+    )
+    return OpenAI(
+        api_key=st.secrets['OPENAI_API_KEY'],
+        base_url=st.secrets.get('OPENAI_BASE_URL'),
+        http_client=http_client,
+        max_retries=0
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def get_circuit_breaker():
+    return CircuitBreaker()
+
+
+@st.cache_resource(show_spinner=False)
+def get_request_semaphore():
+    return threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+
+def is_retryable(error, idempotent):
+    if isinstance(error, RateLimitError):
+        return True
+    if not idempotent:
+        return False
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500
+    return isinstance(error, APIConnectionError)
+
+
+def backoff_delay(attempt, error):
+    retry_after = None
+    response = getattr(error, 'response', None)
+    if response is not None:
+        try:
+            retry_after = float(response.headers.get('retry-after'))
+        except (TypeError, ValueError):
+            retry_after = None
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX)
+    # Full jitter exponential backoff.
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def call_openai(method, *args, timeout=DEFAULT_TIMEOUT, idempotent=True, **kwargs):
+    # Runs an OpenAI SDK call with a per-call timeout, a process-wide concurrency limit,
+    # the circuit breaker and jittered exponential retries on 429/5xx/connection errors.
+    # Requests that create something are only retried when they were rejected (429).
+    breaker = get_circuit_breaker()
+    semaphore = get_request_semaphore()
+    for attempt in range(MAX_RETRIES + 1):
+        if not semaphore.acquire(timeout=timeout):
+            raise TimeoutError('Too many concurrent OpenAI requests, please try again.')
+        try:
+            # Checked once a slot is free, so a probe always gets to record its outcome.
+            breaker.before_call()
+            result = method(*args, timeout=timeout, **kwargs)
+        except CircuitOpenError:
+            raise
+        except (APIStatusError, APIConnectionError) as e:
+            error = e
+        except Exception:
+            breaker.record_failure()
+            raise
+        else:
+            breaker.record_success()
+            return result
+        finally:
+            semaphore.release()
+
+        if isinstance(error, APIConnectionError) or (isinstance(error, APIStatusError) and error.status_code >= 500):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        if attempt == MAX_RETRIES or not is_retryable(error, idempotent):
+            raise error
+        time.sleep(backoff_delay(attempt, error))
@@ -2,10 +2,13 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 
+from scripts.viz import time_buckets
+from scripts.memo import memoize, memoize_figure
+
 rating_colors_index = {'0': '#B3B3B3', '1': '#EA4335', '2': '#e98f41', '3': '#FBBC05', '4': '#a5c553', '5': '#34A853'}
 rating_colors = {0: '#B3B3B3', 1: '#EA4335', 2: '#e98f41', 3: '#FBBC05', 4: '#a5c553', 5: '#34A853'}
 
-def overview(data):
+def rating_sorted(data):
     data_rating_sorted = (
         data
         .sort_values(by='REVIEW_DATE') 
@@ -15,6 +18,100 @@ def overview(data):
         .sort_values(by=['PLACE_TOTAL_SCORE', ('RATING', 'count')], ascending=[False, False])  
     )
     data_rating_sorted.columns = ['PLACE_ID', 'ADDRESS', 'PLACE_TOTAL_SCORE', 'PLACE_URL', 'RATING', 'COUNT']
+    return data_rating_sorted
+
+def rating_distribution(locations, title):
+    rating_distribution = locations['RATING'].apply(lambda ratings: pd.Series(ratings).value_counts(normalize=True).reindex([1, 2, 3, 4, 5], fill_value=0)).fillna(0)
+    rating_distribution.index = locations['ADDRESS']
+    rating_distribution = rating_distribution.sort_index(axis=1, ascending=False).iloc[::-1]
+
+    fig = px.bar(
+        rating_distribution,
+        x=rating_distribution.columns,
+        y=rating_distribution.index,
+        orientation='h',
+        labels={'value': 'Percentage', 'index': 'Location', 'rating': 'Rating', 'variable': 'Rating'},
+        title=title,
+        color_discrete_map=rating_colors_index
+    )
+    fig.update_traces(hovertemplate='%{x:.2%}<extra></extra>')
+    fig.update_layout(
+        showlegend=False, 
+        xaxis_title=None, 
+        yaxis_title=None, 
+        xaxis_tickformat='.0%',
+        xaxis={'showticklabels': False},
+        yaxis={'tickvals': rating_distribution.index, 'ticktext': rating_distribution.index}
+    )
+    return fig
+
+def count_of_ratings(data):
+    rating_counts = data['RATING'].value_counts().reindex([1, 2, 3, 4, 5], fill_value=0)
+
+    return (
+        px.bar(x=rating_counts.values,
+               y=rating_counts.index,
+               orientation='h',
+               labels={'x': 'Count', 'y': 'Rating'},
+               title='Count of Ratings',
+               text=rating_counts.values,
+               color=rating_counts.index.map(rating_colors),
+               color_discrete_map='identity')
+        .update_traces(textposition='inside', textfont_color='white', texttemplate='%{text:,}')
+        .update_layout(xaxis_title=None, hovermode=False)
+        .update_yaxes(title_text=None)
+    )
+
+def count_of_ratings_over_time(data):
+    review_dates, bucket_label = time_buckets(data['REVIEW_DATE'])
+    count_ratings_per_day = data.groupby([review_dates, 'RATING']).size().reset_index(name='COUNT')
+    count_ratings_per_day['RATING'] = count_ratings_per_day['RATING'].astype(str)
+    count_ratings_per_day = count_ratings_per_day.sort_values(by='RATING')
+
+    fig_count_ratings = px.bar(
+        count_ratings_per_day,
+        x='REVIEW_DATE',
+        y='COUNT',
+        color='RATING',
+        labels={'COUNT': 'Count', 'RATING': 'Rating', 'REVIEW_DATE': 'Date'},
+        title=f'Count of Ratings Per {bucket_label} Across All Selected Locations',
+        color_discrete_map=rating_colors_index,
+        opacity=0.8
+    )
+
+    fig_count_ratings.update_traces(hovertemplate='Count: %{y}<extra></extra>')
+    fig_count_ratings.update_layout(xaxis_title=None, showlegend=False, hovermode='x')
+    return fig_count_ratings
+
+def rating_alerts(data_rating_sorted, anomalies):
+    alerts = data_rating_sorted[['PLACE_ID', 'ADDRESS']].merge(anomalies, on='PLACE_ID')
+    if alerts.empty:
+        return alerts
+    with st.container(border=True):
+        st.markdown(f"##### ⚠️ Rating Alerts ({len(alerts)})")
+        st.caption("_Locations whose recent reviews are significantly worse than their long-term average._")
+        st.dataframe(
+            alerts,
+            column_order=('ADDRESS', 'ALERT', 'BASELINE_RATING', 'RECENT_RATING', 'BASELINE_NEGATIVE', 'RECENT_NEGATIVE'),
+            column_config={
+                "ADDRESS": st.column_config.Column("Location", width="medium"),
+                "ALERT": st.column_config.Column("Alert", width="medium"),
+                "BASELINE_RATING": st.column_config.NumberColumn("Usual Rating", format="%.2f"),
+                "RECENT_RATING": st.column_config.NumberColumn("Recent Rating", format="%.2f"),
+                "BASELINE_NEGATIVE": st.column_config.NumberColumn("Usual Negative Share", format="percent"),
+                "RECENT_NEGATIVE": st.column_config.NumberColumn("Recent Negative Share", format="percent")
+            },
+            hide_index=True,
+            use_container_width=True)
+    return alerts
+
+def overview(data, signature=None, anomalies=None):
+    data_rating_sorted = memoize(signature, 'rating_sorted', lambda: rating_sorted(data))
+
+    ## RATING ALERTS
+    alert_ids = []
+    if anomalies is not None and not anomalies.empty:
+        alert_ids = rating_alerts(data_rating_sorted, anomalies)['PLACE_ID'].tolist()
 
     ## RATING DISTRIBUTION FOR TOP/BOTTOM X    
     col1, col2, col3 = st.columns([0.42, 0.42, 0.16], vertical_alignment='center', gap='small')
@@ -26,62 +123,31 @@ def overview(data):
         st.caption("Select the minimum number of reviews")   
         num_reviews = st.number_input("Reviews", min_value=min_count, max_value=max_count, value=min_count, label_visibility='collapsed')
     
+    selected_locations = data_rating_sorted[data_rating_sorted['COUNT'] >= num_reviews]
+    selected_locations = selected_locations.assign(ALERT=selected_locations['PLACE_ID'].isin(alert_ids).map({True: '⚠️', False: ''}))
     with col1:
-        top_locations = data_rating_sorted[data_rating_sorted['COUNT'] >= num_reviews].head(top_x)
-        top_rating_distribution = top_locations['RATING'].apply(lambda ratings: pd.Series(ratings).value_counts(normalize=True).reindex([1, 2, 3, 4, 5], fill_value=0)).fillna(0)
-        top_rating_distribution.index = top_locations['ADDRESS']
-        top_rating_distribution = top_rating_distribution.sort_index(axis=1, ascending=False).iloc[::-1]
-
-        fig_top = px.bar(
-            top_rating_distribution,
-            x=top_rating_distribution.columns,
-            y=top_rating_distribution.index,
-            orientation='h',
-            labels={'value': 'Percentage', 'index': 'Location', 'rating': 'Rating', 'variable': 'Rating'},
-            title=f'Rating Distribution for Top {top_x} Locations',
-            color_discrete_map=rating_colors_index
-        )
-        fig_top.update_traces(hovertemplate='%{x:.2%}<extra></extra>')
-        fig_top.update_layout(
-            showlegend=False, 
-            xaxis_title=None, 
-            yaxis_title=None, 
-            xaxis_tickformat='.0%',
-            xaxis={'showticklabels': False},
-            yaxis={'tickvals': top_rating_distribution.index, 'ticktext': top_rating_distribution.index}
+        fig_top = memoize_figure(
+            signature, ('rating_distribution_top', top_x, int(num_reviews)),
+            lambda: rating_distribution(selected_locations.head(top_x), f'Rating Distribution for Top {top_x} Locations')
         )
         st.plotly_chart(fig_top, use_container_width=True)
         
     with col2:
-        bottom_locations = data_rating_sorted[data_rating_sorted['COUNT'] >= num_reviews].tail(top_x)
-        bottom_rating_distribution = bottom_locations['RATING'].apply(lambda ratings: pd.Series(ratings).value_counts(normalize=True).reindex([1, 2, 3, 4, 5], fill_value=0)).fillna(0)
-        bottom_rating_distribution.index = bottom_locations['ADDRESS']
-        bottom_rating_distribution = bottom_rating_distribution.sort_index(axis=1, ascending=False).iloc[::-1]
-
-        fig_bottom = px.bar(
-            bottom_rating_distribution,
-            x=bottom_rating_distribution.columns,
-            y=bottom_rating_distribution.index,
-            orientation='h',
-            labels={'value': 'Percentage', 'index': 'Location', 'rating': 'Rating', 'variable': 'Rating'},
-            title=f'Rating Distribution for Bottom {top_x} Locations',
-            color_discrete_map=rating_colors_index
-        )
-        fig_bottom.update_traces(hovertemplate='%{x:.2%}<extra></extra>')
-        fig_bottom.update_layout(
-            showlegend=False, 
-            xaxis_title=None, 
-            yaxis_title=None, 
-            xaxis_tickformat='.0%',
-            xaxis={'showticklabels': False},
-            yaxis={'tickvals': bottom_rating_distribution.index, 'ticktext': bottom_rating_distribution.index}
+        fig_bottom = memoize_figure(
+            signature, ('rating_distribution_bottom', top_x, int(num_reviews)),
+            lambda: rating_distribution(selected_locations.tail(top_x), f'Rating Distribution for Bottom {top_x} Locations')
         )
         st.plotly_chart(fig_bottom, use_container_width=True)
 
     st.dataframe(
-        data_rating_sorted[data_rating_sorted['COUNT'] >= num_reviews],
-        column_order=('PLACE_TOTAL_SCORE', 'ADDRESS', 'RATING', 'COUNT', 'PLACE_URL'),
+        selected_locations,
+        column_order=('ALERT', 'PLACE_TOTAL_SCORE', 'ADDRESS', 'RATING', 'COUNT', 'PLACE_URL'),
         column_config={
+            "ALERT": st.column_config.Column(
+                "",
+                width="small",
+                help="Significant drop in recent ratings"
+            ),
             "PLACE_TOTAL_SCORE": st.column_config.ProgressColumn(
                 "Location Rating",
                 width="small",
@@ -116,41 +182,10 @@ def overview(data):
     col1, col2 = st.columns([0.2, 0.8], gap='medium', vertical_alignment='top')
     ## COUNT OF RATINGS
     with col1: 
-        rating_counts = data['RATING'].value_counts().reindex([1, 2, 3, 4, 5], fill_value=0)
-
-        fig_ratings = (
-            px.bar(x=rating_counts.values,
-                   y=rating_counts.index,
-                   orientation='h',
-                   labels={'x': 'Count', 'y': 'Rating'},
-                   title='Count of Ratings',
-                   text=rating_counts.values,
-                   color=rating_counts.index.map(rating_colors),
-                   color_discrete_map='identity')
-            .update_traces(textposition='inside', textfont_color='white', texttemplate='%{text:,}')
-            .update_layout(xaxis_title=None, hovermode=False)
-            .update_yaxes(title_text=None)
-        )
+        fig_ratings = memoize_figure(signature, 'count_of_ratings', lambda: count_of_ratings(data))
         st.plotly_chart(fig_ratings, use_container_width=True)
     
-    ## COUNT OF RATINGS PER DAY
+    ## COUNT OF RATINGS PER DAY/WEEK/MONTH
     with col2:
-        data['REVIEW_DATE'] = pd.to_datetime(data['REVIEW_DATE']).dt.date
-        count_ratings_per_day = data.groupby(['REVIEW_DATE', 'RATING']).size().reset_index(name='COUNT')
-        count_ratings_per_day['RATING'] = count_ratings_per_day['RATING'].astype(str)
-        count_ratings_per_day = count_ratings_per_day.sort_values(by='RATING')
-
-        fig_count_ratings = px.bar(
-            count_ratings_per_day,
-            x='REVIEW_DATE',
-            y='COUNT',
-            color='RATING',
-            labels={'COUNT': 'Count', 'RATING': 'Rating', 'REVIEW_DATE': 'Date'},
-            title='Count of Ratings Per Day Across All Selected Locations',
-            color_discrete_map=rating_colors_index,
-            opacity=0.8
-        )
-
-        fig_count_ratings.update_traces(hovertemplate='Count: %{y}<extra></extra>')
-        fig_count_ratings.update_layout(xaxis_title=None, showlegend=False, hovermode='x')
-        st.plotly_chart(fig_count_ratings, use_container_width=True)
\ No newline at end of file
+        fig_count_ratings = memoize_figure(signature, 'count_of_ratings_over_time', lambda: count_of_ratings_over_time(data))
+        st.plotly_chart(fig_count_ratings, use_container_width=True)
@@ -0,0 +1,235 @@
+# Headless export of per-location (or per-city) summary reports, built with the same aggregations as the dashboard.
+#
+#   python -m scripts.report --reviews reviews.csv --locations locations.csv --out reports --days 7
+#   python -m scripts.report --reviews reviews.csv --locations locations.csv --by city --format html png --workers 8
+#
+# PNG export needs the kaleido package.
+import argparse
+import base64
+import html
+import importlib.util
+import io
+import os
+import re
+import time
+
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PIL import Image
+
+from scripts.scoring import fill_missing_scores
+from scripts.viz import metric_values, sentiment_donut
+from scripts.overview import rating_sorted, rating_distribution, count_of_ratings, count_of_ratings_over_time
+from scripts.ai_analysis import average_rating_per_bucket, average_rating_chart, keyword_cloud
+
+GROUP_COLUMNS = {'location': 'PLACE_ID', 'city': 'CITY'}
+LATEST_REVIEWS = 10
+TOP_LOCATIONS = 10
+KEYWORD_CLOUD_SIZE = (1200, 240)
+
+# Set in every worker by init_worker, so the data is sent to each process once instead of once per report.
+worker_data = None
+worker_groups = None
+worker_options = None
+
+
+def load_data(reviews_path, locations_path, days=None):
+    reviews = pd.read_csv(reviews_path)
+    if {'REVIEW_TEXT', 'SENTIMENT', 'KEYWORDS'}.issubset(reviews.columns):
+        reviews = fill_missing_scores(reviews)
+    reviews['RATING'] = reviews['RATING'].astype(int)
+    reviews['REVIEW_DATE'] = pd.to_datetime(reviews['REVIEW_DATE'])
+    data = reviews.merge(pd.read_csv(locations_path), on='PLACE_ID', how='inner')
+    # All-time totals per group are compared with the reporting period in the header.
+    data['IN_PERIOD'] = True
+    if days is not None:
+        data['IN_PERIOD'] = data['REVIEW_DATE'] >= data['REVIEW_DATE'].max() - pd.Timedelta(days=days)
+    return data
+
+
+def init_worker(data, group_column, options):
+    global worker_data, worker_groups, worker_options
+    worker_data = data
+    worker_groups = data.groupby(group_column).indices
+    worker_options = options
+
+
+def slugify(text, max_length=80):
+    return re.sub(r'[^A-Za-z0-9]+', '-', str(text)).strip('-').lower()[:max_length] or 'report'
+
+
+def report_name(data, group_column, key):
+    if group_column == 'PLACE_ID':
+        return data['ADDRESS'].iloc[0]
+    return str(key)
+
+
+def report_figures(period_data):
+    data_rating_sorted = rating_sorted(period_data)
+    avg_rating_per_day, bucket_label = average_rating_per_bucket(period_data)
+    figures = {
+        'sentiment': sentiment_donut(period_data).update_layout(height=300, title='Sentiment Distribution'),
+        'ratings': count_of_ratings(period_data),
+        'ratings_over_time': count_of_ratings_over_time(period_data),
+        'average_rating': average_rating_chart(avg_rating_per_day, bucket_label, show_rolling=True)
+    }
+    if len(data_rating_sorted) > 1:
+        figures['top_locations'] = rating_distribution(
+            data_rating_sorted.head(TOP_LOCATIONS), f'Rating Distribution for Top {TOP_LOCATIONS} Locations'
+        )
+    return figures
+
+
+def keyword_image(period_data):
+    try:
+        image = Image.fromarray(keyword_cloud(period_data, *KEYWORD_CLOUD_SIZE))
+    except ValueError:
+        # WordCloud raises when there are no keywords.
+        return None
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def metrics_html(data, period_data):
+    review_count, avg_rating, location_count = metric_values(period_data)
+    total_reviews, total_avg_rating, _ = metric_values(data)
+    items = [
+        ('📍 Locations', f'{location_count:,}'),
+        ('📝 Reviews', f'{review_count:,} <small>of {total_reviews:,}</small>'),
+        ('⭐️ Average Rating', f'{avg_rating:.2f} <small>avg for all: {total_avg_rating:.2f}</small>')
+    ]
+    return ''.join(f'<div class="metric"><h3>{label}</h3><p>{value}</p></div>' for label, value in items)
+
+
+def latest_reviews_html(period_data):
+    columns = ['REVIEW_DATE', 'ADDRESS', 'RATING', 'SENTIMENT', 'REVIEW_TEXT']
+    latest = period_data.sort_values('REVIEW_DATE', ascending=False).head(LATEST_REVIEWS)[columns]
+    latest = latest.assign(REVIEW_DATE=latest['REVIEW_DATE'].dt.date)
+    return latest.rename(columns={'REVIEW_DATE': 'Date', 'ADDRESS': 'Location', 'RATING': 'Rating',
+                                  'SENTIMENT': 'Sentiment', 'REVIEW_TEXT': 'Review'}).to_html(index=False, na_rep='')
+
+
+def render_html(name, data, period_data, figures, keywords_png, period_label):
+    charts = ''.join(
+        f'<div class="chart">{figure.to_html(full_html=False, include_plotlyjs=False)}</div>' for figure in figures.values()
+    )
+    keywords = ''
+    if keywords_png is not None:
+        keywords = f'<h2>Keywords</h2><img class="keywords" src="data:image/png;base64,{base64.b64encode(keywords_png).decode()}">'
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{html.escape(name)}</title>
+<script src="https://cdn.plot.ly/plotly-2.35.2.min.js"></script>
+<style>
+body {{ font-family: sans-serif; color: #3A3A3A; margin: 32px; }}
+.metrics {{ display: flex; gap: 16px; }}
+.metric {{ flex: 1; text-align: center; border: 1px solid #E6E6E6; border-radius: 8px; }}
+.metric h3 {{ font-size: 16px; }}
+.metric p {{ font-size: 28px; font-weight: bold; }}
+.metric small {{ display: block; font-size: 14px; font-weight: normal; color: #808080; }}
+.keywords {{ width: 100%; }}
+table {{ border-collapse: collapse; width: 100%; font-size: 14px; }}
+th, td {{ border-bottom: 1px solid #E6E6E6; padding: 6px; text-align: left; vertical-align: top; }}
+</style>
+</head>
+<body>
+<h1>{html.escape(name)}</h1>
+<p>{html.escape(period_label)}</p>
+<div class="metrics">{metrics_html(data, period_data)}</div>
+{charts}
+{keywords}
+<h2>Latest Reviews</h2>
+{latest_reviews_html(period_data)}
+</body>
+</html>
+"""
+
+
+def export_report(key):
+    start = time.perf_counter()
+    data = worker_data.iloc[worker_groups[key]]
+    period_data = data[data['IN_PERIOD']]
+    name = report_name(data, worker_options['group_column'], key)
+    if period_data.empty:
+        return name, [], time.perf_counter() - start
+
+    slug = slugify(name)
+    if worker_options['group_column'] == 'PLACE_ID':
+        slug = f'{slug}-{slugify(key, 12)}'
+    figures = report_figures(period_data)
+    keywords_png = keyword_image(period_data)
+    first_date, last_date = period_data['REVIEW_DATE'].min().date(), period_data['REVIEW_DATE'].max().date()
+    period_label = f'Reviews from {first_date} to {last_date}'
+
+    written = []
+    out_dir = worker_options['out_dir']
+    if 'html' in worker_options['formats']:
+        path = os.path.join(out_dir, f'{slug}.html')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(render_html(name, data, period_data, figures, keywords_png, period_label))
+        written.append(path)
+    if 'png' in worker_options['formats']:
+        png_dir = os.path.join(out_dir, slug)
+        os.makedirs(png_dir, exist_ok=True)
+        for figure_name, figure in figures.items():
+            path = os.path.join(png_dir, f'{figure_name}.png')
+            figure.write_image(path, width=1200, height=500)
+            written.append(path)
+        if keywords_png is not None:
+            path = os.path.join(png_dir, 'keywords.png')
+            with open(path, 'wb') as file:
+                file.write(keywords_png)
+            written.append(path)
+    return name, written, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export per-location or per-city review reports')
+    parser.add_argument('--reviews', required=True, help='CSV export of the reviews table')
+    parser.add_argument('--locations', required=True, help='CSV export of the locations table')
+    parser.add_argument('--out', default='reports', help='output directory')
+    parser.add_argument('--by', choices=sorted(GROUP_COLUMNS), default='location', help='one report per location or per city')
+    parser.add_argument('--format', nargs='+', choices=['html', 'png'], default=['html'], dest='formats')
+    parser.add_argument('--days', type=int, help='only report the last N days of reviews, e.g. 7 for a weekly summary')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--limit', type=int, help='export only the first N reports')
+    args = parser.parse_args()
+
+    if 'png' in args.formats and importlib.util.find_spec('kaleido') is None:
+        parser.error('PNG export needs the kaleido package (pip install kaleido).')
+
+    start = time.perf_counter()
+    data = load_data(args.reviews, args.locations, args.days)
+    group_column = GROUP_COLUMNS[args.by]
+    keys = data.loc[data['IN_PERIOD'], group_column].drop_duplicates().tolist()[:args.limit]
+    os.makedirs(args.out, exist_ok=True)
+    print(f'Loaded {len(data):,} reviews in {time.perf_counter() - start:.1f}s, exporting {len(keys):,} reports '
+          f'with {args.workers} workers')
+
+    options = {'group_column': group_column, 'formats': args.formats, 'out_dir': args.out}
+    export_start = time.perf_counter()
+    report_seconds = 0.0
+    files = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(data, group_column, options)) as executor:
+        futures = {executor.submit(export_report, key): key for key in keys}
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                name, written, seconds = future.result()
+            except Exception as e:
+                print(f'[{done}/{len(keys)}] {futures[future]} failed: {e}')
+                continue
+            report_seconds += seconds
+            files += len(written)
+            print(f'[{done}/{len(keys)}] {name} ({seconds:.1f}s)')
+
+    elapsed = time.perf_counter() - export_start
+    print(f'Exported {files:,} files to {args.out} in {elapsed:.1f}s '
+          f'({len(keys) / elapsed if elapsed else 0:.1f} reports/s, {report_seconds:.1f}s of report work)')
+
+
+if __name__ == '__main__':
+    main()
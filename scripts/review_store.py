@@ -0,0 +1,214 @@
+# Optional Parquet store of the reviews table, partitioned by state and review month.
+#
+#   python -m scripts.review_store --reviews reviews.csv --locations locations.csv --out reviews_store
+#
+# Set reviews_store_path in .streamlit/secrets.toml to let the app read only the partitions
+# matching the selected states and dates instead of loading the whole reviews table.
+# The store is a snapshot: Support can't save edits while the app reads from it.
+#
+# Every build is written to its own version directory and _VERSION is switched to it once complete,
+# so readers of the previous version are never pointed at half-written partitions.
+import streamlit as st
+import pandas as pd
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from scripts.scoring import fill_missing_scores
+from scripts.sapi import record_load_time
+
+PARTITION_COLUMNS = ['COUNTRY_CODE', 'REVIEW_MONTH']
+PARTITIONING = ds.partitioning(pa.schema([('COUNTRY_CODE', pa.string()), ('REVIEW_MONTH', pa.string())]), flavor='hive')
+# Parsed review date, sorted within each partition so the row group statistics can skip most of a month.
+# Row groups are small enough to split a typical state and month into several date ranges.
+DATE_COLUMN = 'REVIEW_TS'
+ROW_GROUP_SIZE = 4 * 1024
+VERSION_FILE = '_VERSION'
+# Fingerprint of the reviews of every month, written with each version.
+MONTHS_FILE = '_MONTHS.json'
+FINGERPRINT_COLUMNS = ['REVIEW_ID', 'RATING', 'SENTIMENT']
+# The previous version is kept for sessions still reading it.
+KEEP_VERSIONS = 2
+MAX_SLICES = 8
+
+
+def build_store(reviews, locations, path):
+    dates = pd.to_datetime(reviews['REVIEW_DATE'])
+    reviews = reviews.assign(**{DATE_COLUMN: dates, 'REVIEW_MONTH': dates.dt.strftime('%Y-%m')}).merge(
+        locations[['PLACE_ID', 'COUNTRY_CODE']].drop_duplicates('PLACE_ID'), on='PLACE_ID', how='inner'
+    )
+    reviews = reviews.sort_values(['COUNTRY_CODE', DATE_COLUMN], kind='stable')
+    version = format(time.time_ns(), 'x')
+    version_path = os.path.join(path, version)
+    ds.write_dataset(
+        pa.Table.from_pandas(reviews, preserve_index=False),
+        version_path,
+        format='parquet',
+        partitioning=PARTITIONING,
+        existing_data_behavior='error',
+        max_rows_per_group=ROW_GROUP_SIZE,
+        min_rows_per_group=min(ROW_GROUP_SIZE, max(len(reviews), 1)),
+        file_options=ds.ParquetFileFormat().make_write_options(compression='zstd')
+    )
+    columns = [column for column in FINGERPRINT_COLUMNS if column in reviews.columns]
+    hashes = pd.util.hash_pandas_object(reviews[columns], index=False)
+    fingerprints = hashes.groupby(reviews['REVIEW_MONTH'].values).sum()
+    with open(os.path.join(version_path, MONTHS_FILE), 'w') as file:
+        json.dump({month: format(int(fingerprint), 'x') for month, fingerprint in fingerprints.items()}, file)
+    # Switched last with an atomic rename, readers pick up the new version once it is complete.
+    pointer = os.path.join(path, VERSION_FILE)
+    with open(f'{pointer}.tmp', 'w') as file:
+        file.write(version)
+    os.replace(f'{pointer}.tmp', pointer)
+    remove_old_versions(path)
+    return len(reviews)
+
+
+def store_versions(path):
+    # Version directories, oldest first.
+    versions = []
+    for name in os.listdir(path):
+        try:
+            versions.append((int(name, 16), name))
+        except ValueError:
+            continue
+    return [name for _, name in sorted(versions) if os.path.isdir(os.path.join(path, name))]
+
+
+def remove_old_versions(path, keep=KEEP_VERSIONS):
+    current = store_version(path)
+    for version in store_versions(path)[:-keep]:
+        if version != current:
+            shutil.rmtree(os.path.join(path, version), ignore_errors=True)
+
+
+def store_version(path):
+    try:
+        with open(os.path.join(path, VERSION_FILE)) as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def open_store(path, version):
+    return ds.dataset(os.path.join(path, version), format='parquet', partitioning=PARTITIONING)
+
+
+def state_predicate(states):
+    return pc.field('COUNTRY_CODE').isin(list(states))
+
+
+@st.cache_data(show_spinner=False)
+def store_date_range(path, version, states):
+    # First and last day covered by the partitions of the states, read from the partition paths only.
+    months = [
+        ds.get_partition_keys(fragment.partition_expression).get('REVIEW_MONTH')
+        for fragment in open_store(path, version).get_fragments(filter=state_predicate(states))
+    ]
+    months = sorted(month for month in months if month)
+    if not months:
+        return None, None
+    return pd.Timestamp(months[0]), pd.Timestamp(months[-1]) + pd.offsets.MonthEnd(0) + pd.Timedelta(hours=23, minutes=59)
+
+
+@st.cache_resource(show_spinner='Loading data... 📊', max_entries=MAX_SLICES)
+def read_slice(path, version, states, start_date=None, end_date=None):
+    # Partition pruning on state and month, row group pruning on the review date.
+    start = time.perf_counter()
+    dataset = open_store(path, version)
+    predicate = state_predicate(states)
+    if start_date is not None:
+        predicate &= (pc.field('REVIEW_MONTH') >= start_date.strftime('%Y-%m')) & (pc.field(DATE_COLUMN) >= start_date.to_datetime64())
+    if end_date is not None:
+        predicate &= (pc.field('REVIEW_MONTH') <= end_date.strftime('%Y-%m')) & (pc.field(DATE_COLUMN) <= end_date.to_datetime64())
+    columns = [column for column in dataset.schema.names if column not in PARTITION_COLUMNS + [DATE_COLUMN]]
+    df = dataset.to_table(columns=columns, filter=predicate).to_pandas()
+    if 'RATING' in df.columns:
+        df['RATING'] = df['RATING'].astype(int)
+    slice_key = repr((sorted(states), start_date, end_date)).encode('utf-8')
+    df.attrs['DATA_VERSION'] = f"{version}-{hashlib.sha1(slice_key).hexdigest()[:12]}"
+    record_load_time('reviews slice', start)
+    return df
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def place_totals(path, version):
+    # Review count and rating sum per location, aggregated batch by batch without loading the table.
+    totals = []
+    for batch in open_store(path, version).to_batches(columns=['PLACE_ID', 'RATING']):
+        if batch.num_rows:
+            totals.append(pa.Table.from_batches([batch]).group_by('PLACE_ID').aggregate([('RATING', 'count'), ('RATING', 'sum')]).to_pandas())
+    if not totals:
+        return pd.DataFrame(columns=['PLACE_ID', 'REVIEWS', 'RATING_SUM'])
+    totals = pd.concat(totals).groupby('PLACE_ID')[['RATING_count', 'RATING_sum']].sum().reset_index()
+    return totals.rename(columns={'RATING_count': 'REVIEWS', 'RATING_sum': 'RATING_SUM'})
+
+
+def month_fingerprints(path, version):
+    # {month: fingerprint} of a version, None for stores written without them.
+    try:
+        with open(os.path.join(path, version, MONTHS_FILE)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+@st.cache_resource(show_spinner=False)
+def get_tracked_months():
+    # Month -> fingerprint of the store months already fed to the anomaly tracker.
+    return {}
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def store_anomalies(path, version):
+    # Rating alerts over the whole store, fed to the tracker month by month in date order
+    # so only one month of reviews is in memory at a time. A new version only reads the months
+    # whose reviews changed since they were last fed to the tracker.
+    from scripts.anomalies import rating_anomalies, get_anomaly_tracker
+    dataset = open_store(path, version)
+    fingerprints = month_fingerprints(path, version)
+    if fingerprints is None:
+        fingerprints = {
+            month: None for month in
+            {ds.get_partition_keys(fragment.partition_expression).get('REVIEW_MONTH') for fragment in dataset.get_fragments()} - {None}
+        }
+    tracked = get_tracked_months()
+    months = sorted(month for month, fingerprint in fingerprints.items() if fingerprint is None or tracked.get(month) != fingerprint)
+    alerts = None
+    for month in months:
+        reviews = dataset.to_table(
+            columns=['REVIEW_ID', 'PLACE_ID', 'RATING', 'SENTIMENT', 'REVIEW_DATE'],
+            filter=pc.field('REVIEW_MONTH') == month
+        ).to_pandas()
+        reviews.attrs['DATA_VERSION'] = f'{version}-{month}'
+        alerts = rating_anomalies(reviews)
+        tracked[month] = fingerprints[month]
+    return alerts if alerts is not None else get_anomaly_tracker().detect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write the reviews table as a partitioned Parquet store')
+    parser.add_argument('--reviews', required=True, help='CSV export of the reviews table')
+    parser.add_argument('--locations', required=True, help='CSV export of the locations table')
+    parser.add_argument('--out', required=True, help='store directory')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    reviews = pd.read_csv(args.reviews)
+    if {'REVIEW_TEXT', 'SENTIMENT', 'KEYWORDS'}.issubset(reviews.columns):
+        reviews = fill_missing_scores(reviews)
+    rows = build_store(reviews, pd.read_csv(args.locations), args.out)
+    files = open_store(args.out, store_version(args.out)).files
+    print(f'Wrote {rows:,} reviews to {len(files):,} files in {args.out} in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,124 @@
 import streamlit as st
 import pandas as pd
 import os
+import threading
+import time
 
-from kbcstorage.client import Client, Files
-from keboola_streamlit import KeboolaStreamlit
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from scripts.scoring import fill_missing_scores
 
-kbc_client = Client(st.secrets['kbc_url'], st.secrets['KEBOOLA_TOKEN'])
+LOAD_WORKERS = 4
+# Derived lookups kept per data version, several versions are alive when reviews are read as slices.
+MAX_VERSIONS = 8
 
-@st.cache_data(show_spinner='Loading data... 📊')
+# The Keboola libraries are slow to import, they are loaded and their clients created on first use.
+
+@st.cache_resource(show_spinner=False)
+def get_kbc_client():
+    from kbcstorage.client import Client
+    return Client(st.secrets['kbc_url'], st.secrets['KEBOOLA_TOKEN'])
+
+@st.cache_resource(show_spinner=False)
+def get_keboola():
+    from keboola_streamlit import KeboolaStreamlit
+    return KeboolaStreamlit(st.secrets['kbc_url'], st.secrets['KEBOOLA_TOKEN'])
+
+@st.cache_resource(show_spinner=False)
+def get_load_executor():
+    return ThreadPoolExecutor(max_workers=LOAD_WORKERS, thread_name_prefix='source-loader')
+
+@st.cache_resource(show_spinner=False)
+def get_load_timings():
+    return {}
+
+def record_load_time(source, start):
+    get_load_timings()[source] = time.perf_counter() - start
+
+def load_timings():
+    timings = get_load_timings()
+    if not timings:
+        return None
+    return '**Load times:** ' + ', '.join(f'{source} {seconds:.1f}s' for source, seconds in sorted(timings.items(), key=lambda item: -item[1])) + '.'
+
+def load_sources(sources):
+    # Starts all {name: (loader, *args)} at once on the shared pool and returns {name: Future},
+    # so the caller only waits for the tables it needs. Loaders should be cached, a warm call returns immediately.
+    ctx = get_script_run_ctx()
+
+    def run(loader, args):
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return loader(*args)
+
+    executor = get_load_executor()
+    return {name: executor.submit(run, loader, args) for name, (loader, *args) in sources.items()}
+
+# Tables are loaded once per process with st.cache_resource and shared by all sessions without copying.
+# They must be treated as read-only: filter into new frames and derive columns with assign().
+
+@st.cache_resource(show_spinner=False)
 def read_data(table_name):
-    keboola = KeboolaStreamlit(st.secrets['kbc_url'], st.secrets['KEBOOLA_TOKEN'])
-    df = keboola.read_table(table_name)
+    start = time.perf_counter()
+    df = get_keboola().read_table(table_name)
+    version = format(int(pd.util.hash_pandas_object(df, index=False).sum()), 'x')
+    if {'REVIEW_TEXT', 'SENTIMENT', 'KEYWORDS'}.issubset(df.columns):
+        df = fill_missing_scores(df)
+    if 'RATING' in df.columns:
+        df['RATING'] = df['RATING'].astype(int)
+    df.attrs['DATA_VERSION'] = version
+    record_load_time(table_name.split('.')[-1], start)
+    return df
+
+@st.cache_resource(show_spinner=False)
+def read_csv(path):
+    start = time.perf_counter()
+    df = pd.read_csv(path)
+    df.attrs['DATA_VERSION'] = format(int(pd.util.hash_pandas_object(df, index=False).sum()), 'x')
+    record_load_time(os.path.basename(str(path)), start)
     return df
 
+@st.cache_resource(show_spinner=False)
+def read_attributes(path, min_count=20):
+    pronouns_to_remove = ['i', 'you', 'she', 'he', 'it', 'we', 'they', 'I', 'You', 'She', 'He', 'It', 'We', 'They', 'Pete']
+    attributes = read_csv(path)
+    attributes = attributes[~attributes['ENTITY'].isin(pronouns_to_remove)]
+    attributes = attributes.groupby(['ENTITY', 'ATTRIBUTE'])['COUNT'].sum().reset_index()
+    return attributes[attributes['COUNT'] > min_count]
+
+def data_version(df):
+    return df.attrs.get('DATA_VERSION')
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_VERSIONS)
+def _parsed_dates(_df, version, column):
+    return pd.to_datetime(_df[column])
+
+def parsed_dates(df, column='REVIEW_DATE'):
+    # Parsed once per data version, the stored column keeps its original text for write-backs.
+    version = data_version(df)
+    if version is None:
+        return pd.to_datetime(df[column])
+    return _parsed_dates(df, version, column)
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_VERSIONS)
+def _review_id_index(_df, version):
+    return pd.Index(_df['REVIEW_ID'].astype(str))
+
+def review_id_index(df):
+    # REVIEW_ID -> row position lookup, built once per data version instead of a mask scan per lookup.
+    version = data_version(df)
+    if version is None:
+        return pd.Index(df['REVIEW_ID'].astype(str))
+    return _review_id_index(df, version)
+
 def write_table(table_id: str, df: pd.DataFrame, is_incremental: bool = False):    
     csv_path = f'{table_id}.csv'
+    job = None
     try:
         df.to_csv(csv_path, index=False)
         
-        files = Files(st.secrets['kbc_url'], st.secrets['KEBOOLA_TOKEN'])
-        file_id = files.upload_file(file_path=csv_path, tags=['file-import'],
+        kbc_client = get_kbc_client()
+        file_id = kbc_client.files.upload_file(file_path=csv_path, tags=['file-import'],
                                     do_notify=False, is_public=False)
         job = kbc_client.tables.load_raw(table_id=table_id, data_file_id=file_id, is_incremental=is_incremental)
         
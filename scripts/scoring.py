@@ -0,0 +1,133 @@
+import pandas as pd
+import numpy as np
+
+POSITIVE_WORDS = {
+    'good', 'great', 'excellent', 'amazing', 'awesome', 'fantastic', 'perfect', 'wonderful', 'best', 'nice',
+    'friendly', 'helpful', 'polite', 'kind', 'professional', 'quick', 'fast', 'easy', 'efficient', 'patient',
+    'knowledgeable', 'recommend', 'recommended', 'love', 'loved', 'happy', 'satisfied', 'pleasant', 'clean',
+    'smooth', 'thanks', 'thank', 'superb', 'brilliant', 'outstanding', 'reliable', 'quickly', 'solved',
+    'resolved', 'fixed', 'competent', 'welcoming', 'attentive', 'courteous', 'impressed', 'cheap', 'fair',
+    'exceptional', 'top', 'super', 'lovely', 'glad', 'enjoyed', 'convenient', 'informative'
+}
+NEGATIVE_WORDS = {
+    'bad', 'terrible', 'awful', 'horrible', 'worst', 'poor', 'rude', 'unhelpful', 'slow', 'useless',
+    'disappointed', 'disappointing', 'waste', 'waiting', 'waited', 'wait', 'incompetent', 'unprofessional',
+    'problem', 'problems', 'issue', 'issues', 'broken', 'wrong', 'refused', 'ignored', 'annoying', 'expensive',
+    'overpriced', 'scam', 'avoid', 'angry', 'complaint', 'complain', 'dirty', 'unfriendly', 'lied', 'lie',
+    'fraud', 'nightmare', 'pathetic', 'ridiculous', 'shocking', 'disgusting', 'mess', 'failed', 'fail',
+    'cancel', 'cancelled', 'unacceptable', 'hate', 'frustrating', 'frustrated', 'confusing', 'queue', 'closed'
+}
+NEGATIONS = {'not', 'no', "don't", "didn't", "doesn't", "isn't", "wasn't", "aren't", "won't", "can't", 'never', 'nothing', 'hardly'}
+STOPWORDS = {
+    'the', 'and', 'a', 'an', 'to', 'of', 'in', 'is', 'it', 'for', 'on', 'was', 'were', 'with', 'that', 'this',
+    'i', 'me', 'my', 'we', 'our', 'you', 'your', 'he', 'she', 'they', 'them', 'their', 'at', 'as', 'be', 'but',
+    'are', 'have', 'has', 'had', 'so', 'very', 'there', 'from', 'or', 'all', 'just', 'by', 'if', 'out', 'up',
+    'about', 'what', 'when', 'who', 'which', 'would', 'could', 'will', 'can', 'did', 'do', 'does', 'been',
+    'get', 'got', 'one', 'also', 'really', 'even', 'only', 'then', 'than', 'here', 'again', 'more', 'some',
+    'vodafone', 'store', 'shop'
+} | NEGATIONS
+
+LEXICON = pd.Series({**{word: 1.0 for word in POSITIVE_WORDS}, **{word: -1.0 for word in NEGATIVE_WORDS}})
+RATING_WEIGHT = 0.75
+MIXED_RATIO = 0.4
+NUM_KEYWORDS = 5
+TOKEN_PATTERN = r"[a-z][a-z']+"
+# Upstream values of the columns filled locally, written back instead of the local guesses.
+UPSTREAM_COLUMNS = {'SENTIMENT': 'UPSTREAM_SENTIMENT', 'KEYWORDS': 'UPSTREAM_KEYWORDS'}
+
+
+def tokenize(texts):
+    # One row per token, indexed by the position of the review in the batch, in reading order.
+    tokens = texts.fillna('').astype(str).str.lower().str.findall(TOKEN_PATTERN)
+    tokens.index = np.arange(len(tokens))
+    return tokens.explode().dropna()
+
+
+def score_sentiment(tokens, ratings, size):
+    scores = tokens.map(LEXICON).fillna(0.0)
+    previous = tokens.shift(1)
+    negated = previous.isin(NEGATIONS) & (previous.index == tokens.index.to_series().shift(1).values)
+    scores = scores.where(~negated, -scores)
+
+    positive = scores.clip(lower=0).groupby(level=0).sum().reindex(np.arange(size), fill_value=0.0).values
+    negative = (-scores.clip(upper=0)).groupby(level=0).sum().reindex(np.arange(size), fill_value=0.0).values
+    prior = np.nan_to_num((np.asarray(ratings, dtype=float) - 3) * RATING_WEIGHT)
+    positive = positive + np.clip(prior, 0, None)
+    negative = negative + np.clip(-prior, 0, None)
+
+    stronger = np.maximum(positive, negative)
+    weaker = np.minimum(positive, negative)
+    return np.select(
+        [stronger == 0, weaker >= MIXED_RATIO * stronger, positive > negative],
+        ['Unknown', 'Mixed', 'Positive'],
+        default='Negative'
+    )
+
+
+def extract_keywords(tokens, size, num_keywords=NUM_KEYWORDS):
+    # TF-IDF over the batch, the top terms of each review in the same list format as upstream KEYWORDS.
+    terms = tokens[~tokens.isin(STOPWORDS) & (tokens.str.len() > 2)]
+    if terms.empty:
+        return np.full(size, np.nan, dtype=object)
+    counts = terms.groupby([terms.index, terms.values]).size().rename('TF').reset_index()
+    counts.columns = ['ROW', 'TERM', 'TF']
+    document_frequency = counts.groupby('TERM')['ROW'].transform('size')
+    counts['WEIGHT'] = counts['TF'] * np.log((1 + size) / (1 + document_frequency))
+    top_terms = (
+        counts
+        .sort_values(['ROW', 'WEIGHT', 'TERM'], ascending=[True, False, True])
+        .groupby('ROW')
+        .head(num_keywords)
+    )
+    rows = top_terms['ROW'].values
+    terms = top_terms['TERM'].tolist()
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    ends = np.r_[starts[1:], len(rows)]
+    keywords = np.full(size, np.nan, dtype=object)
+    keywords[rows[starts]] = [str(terms[start:end]) for start, end in zip(starts, ends)]
+    return keywords
+
+
+def score_reviews(texts, ratings=None):
+    texts = pd.Series(texts)
+    size = len(texts)
+    if ratings is None:
+        ratings = np.full(size, np.nan)
+    tokens = tokenize(texts)
+    return pd.DataFrame({
+        'SENTIMENT': score_sentiment(tokens, ratings, size),
+        'KEYWORDS': extract_keywords(tokens, size)
+    }, index=texts.index)
+
+
+def fill_missing_scores(df, batch_size=50000):
+    # Only reviews with text and a missing SENTIMENT or KEYWORDS are scored, upstream values are kept.
+    has_text = df['REVIEW_TEXT'].notna() & (df['REVIEW_TEXT'].astype(str).str.strip() != '')
+    missing_sentiment = (has_text & (df['SENTIMENT'].isna() | (df['SENTIMENT'] == 'Unknown'))).values
+    missing_keywords = (has_text & df['KEYWORDS'].isna()).values
+    to_score = np.flatnonzero(missing_sentiment | missing_keywords)
+    if len(to_score) == 0:
+        return df
+
+    sentiment = df['SENTIMENT'].to_numpy(dtype=object, copy=True)
+    keywords = df['KEYWORDS'].to_numpy(dtype=object, copy=True)
+    ratings = pd.to_numeric(df['RATING'], errors='coerce').values if 'RATING' in df.columns else np.full(len(df), np.nan)
+    for start in range(0, len(to_score), batch_size):
+        batch = to_score[start:start + batch_size]
+        scored = score_reviews(df['REVIEW_TEXT'].iloc[batch].reset_index(drop=True), ratings[batch])
+        sentiment_mask = missing_sentiment[batch]
+        keyword_mask = missing_keywords[batch]
+        sentiment[batch[sentiment_mask]] = scored['SENTIMENT'].values[sentiment_mask]
+        keywords[batch[keyword_mask]] = scored['KEYWORDS'].values[keyword_mask]
+    return df.assign(
+        SENTIMENT=sentiment, KEYWORDS=keywords,
+        **{upstream: df[column] for column, upstream in UPSTREAM_COLUMNS.items()}
+    )
+
+
+def upstream_scores(df):
+    # The rows as they are stored upstream, without the locally filled scores.
+    upstream = [column for column in UPSTREAM_COLUMNS.values() if column in df.columns]
+    if not upstream:
+        return df
+    return df.assign(**{column: df[name] for column, name in UPSTREAM_COLUMNS.items() if name in df.columns}).drop(columns=upstream)
@@ -0,0 +1,99 @@
+import streamlit as st
+import pandas as pd
+import sqlite3
+import threading
+
+SEARCH_COLUMNS = ['REVIEW_TEXT', 'KEYWORDS']
+MAX_INDEXES = 8
+
+
+class ReviewSearchIndex:
+    # SQLite FTS5 index over the review text, kept in memory and shared by all sessions.
+    # Rows are keyed by REVIEW_ID, only new or changed rows are (re)indexed on sync and rows that left the table are removed.
+    def __init__(self):
+        self.conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self.conn.execute(
+            "CREATE VIRTUAL TABLE reviews_fts USING fts5("
+            "review_id UNINDEXED, review_text, keywords, tokenize='unicode61 remove_diacritics 2')"
+        )
+        self.lock = threading.Lock()
+        self.version = None
+        self.row_hashes = pd.Series(dtype='uint64')
+
+    def sync(self, reviews_data, version):
+        if version is not None and version == self.version:
+            return
+        with self.lock:
+            if version is not None and version == self.version:
+                return
+            docs = reviews_data[['REVIEW_ID'] + SEARCH_COLUMNS].copy()
+            docs['REVIEW_ID'] = docs['REVIEW_ID'].astype(str)
+            docs = docs.drop_duplicates('REVIEW_ID', keep='last').set_index('REVIEW_ID')
+            hashes = pd.util.hash_pandas_object(docs[SEARCH_COLUMNS].fillna(''), index=False)
+            hashes.index = docs.index
+
+            positions = self.row_hashes.index.get_indexer(hashes.index)
+            known = positions >= 0
+            previous = self.row_hashes.values[positions[known]]
+            changed = hashes.index[known][previous != hashes.values[known]]
+            added = hashes.index[~known]
+            removed = self.row_hashes.index.difference(hashes.index)
+
+            to_index = docs.loc[changed.append(added)].fillna('')
+            with self.conn:
+                if len(changed) > 0 or len(removed) > 0:
+                    self.conn.executemany("DELETE FROM reviews_fts WHERE review_id = ?", ((i,) for i in changed.append(removed)))
+                self.conn.executemany(
+                    "INSERT INTO reviews_fts (review_id, review_text, keywords) VALUES (?, ?, ?)",
+                    zip(to_index.index, to_index['REVIEW_TEXT'].astype(str), to_index['KEYWORDS'].astype(str))
+                )
+
+            self.row_hashes = pd.concat([self.row_hashes.drop(changed.append(removed)), hashes.loc[changed.append(added)]])
+            self.version = version
+
+    def search(self, query, limit=None):
+        match = to_match_expression(query)
+        if not match:
+            return []
+        sql = "SELECT review_id FROM reviews_fts WHERE reviews_fts MATCH ? ORDER BY rank"
+        params = (match,)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = (match, int(limit))
+        with self.lock:
+            try:
+                rows = self.conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError:
+                return []
+        return [row[0] for row in rows]
+
+
+def to_match_expression(query):
+    # Quote every term so user input can't break the FTS5 syntax, a trailing * keeps prefix search.
+    terms = []
+    for term in str(query).split():
+        prefix = term.endswith('*')
+        term = term.rstrip('*').replace('"', '""')
+        if term:
+            terms.append(f'"{term}"*' if prefix else f'"{term}"')
+    return ' '.join(terms)
+
+
+# One index per table, or per slice when reading from the review store.
+@st.cache_resource(show_spinner=False, max_entries=MAX_INDEXES)
+def get_search_index(table_name):
+    return ReviewSearchIndex()
+
+
+def search_reviews(table_name, reviews_data, version, query, limit=None):
+    index = get_search_index(table_name)
+    index.sync(reviews_data, version)
+    return index.search(query, limit=limit)
+
+
+def filter_by_search(data, review_ids):
+    # Keep only matching reviews and order them by search rank.
+    ranks = pd.Series(range(len(review_ids)), index=pd.Index(review_ids, dtype='object'), dtype='int64')
+    positions = data['REVIEW_ID'].astype(str).map(ranks)
+    matched = positions.notna()
+    return data[matched].iloc[positions[matched].argsort(kind='stable')]
@@ -1,8 +1,16 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import hashlib
 
-from scripts.openai import generate_response
-from scripts.sapi import write_table
+from scripts.sapi import write_table, data_version, review_id_index
+from scripts.duplicates import duplicate_clusters
+from scripts.scoring import upstream_scores
+
+def draft_response(prompt):
+    # The OpenAI SDK is only imported once a response draft is requested.
+    from scripts.openai import generate_response
+    return generate_response(prompt)
 
 def sentiment_color(val):
     color_map = {
@@ -14,18 +22,170 @@ def sentiment_color(val):
     return color_map.get(val, '')
 
 
-def support(data, reviews_data):
+EDITABLE_COLUMNS = ['STATUS', 'CUSTOMER_SUCCESS_NOTES']
+DUPLICATES_POLL_INTERVAL = 2
+
+
+def apply_edits(data, edits):
+    # Overlay {REVIEW_ID: {column: value}} edits on the rows of data that they touch.
+    if not edits:
+        return data
+    changes = pd.DataFrame.from_dict(edits, orient='index')
+    positions = changes.index.get_indexer(data['REVIEW_ID'].astype(str))
+    rows = np.flatnonzero(positions >= 0)
+    if len(rows) == 0:
+        return data
+    data = data.copy()
+    for column in changes.columns:
+        values = changes[column].values[positions[rows]]
+        changed = pd.notna(values)
+        data[column] = data[column].astype(object)
+        data.iloc[rows[changed], data.columns.get_loc(column)] = values[changed]
+    return data
+
+
+def diff_edits(original, edited, columns):
+    # Only the changed cells of the changed rows, keyed by REVIEW_ID.
+    edits = {}
+    review_ids = original['REVIEW_ID'].astype(str).values
+    for column in columns:
+        before = original[column].fillna('').astype(str).values
+        after = edited[column].fillna('').astype(str).values
+        changed = np.flatnonzero(before != after)
+        for review_id, value in zip(review_ids[changed], edited[column].values[changed]):
+            # A cleared cell can't be written back, it is not an edit.
+            if pd.notna(value):
+                edits.setdefault(review_id, {})[column] = value
+    return edits
+
+
+def track_edits(original, edited):
+    pending = st.session_state['pending_edits']
+    for review_id in original['REVIEW_ID'].astype(str):
+        changes = pending.get(review_id)
+        if changes:
+            for column in EDITABLE_COLUMNS:
+                changes.pop(column, None)
+            if not changes:
+                del pending[review_id]
+    # Cleared notes are saved as empty text, a cleared status is ignored.
+    edited = edited.fillna({'CUSTOMER_SUCCESS_NOTES': ''})
+    for review_id, changes in diff_edits(original, edited, EDITABLE_COLUMNS).items():
+        pending.setdefault(review_id, {}).update(changes)
+
+
+def editor_input(data, reviews_data):
+    # The editor keeps its edits and selection in its widget state as long as its key and input stay the same,
+    # so the input is only rebuilt, with the pending edits and selection at that point, when the shown reviews,
+    # the data version or the saved edits change.
+    review_ids = data['REVIEW_ID'].astype(str)
+    signature = hashlib.sha1(pd.util.hash_pandas_object(review_ids, index=False).values.tobytes())
+    signature.update(f"{data_version(reviews_data)}-{st.session_state.get('saves', 0)}".encode('utf-8'))
+    editor_key = f'support_editor_{signature.hexdigest()[:16]}'
+    if st.session_state.get('editor_key') != editor_key:
+        selected = review_ids.isin(st.session_state['selected_reviews'])
+        editor_data = apply_edits(data, st.session_state['pending_edits']).assign(
+            SELECT=selected.values if selected.any() else [True] + [False] * (len(data) - 1)
+        )
+        st.session_state['editor_input'] = editor_data[['SELECT', 'REVIEW_ID', 'REVIEWER_NAME', 'SENTIMENT', 'REVIEW_TEXT', 'RATING', 'ADDRESS',
+                                                        'REVIEW_DATE', 'CUSTOMER_SUCCESS_NOTES', 'REVIEW_URL', 'STATUS', 'RESPONSE']]
+        st.session_state['editor_key'] = editor_key
+    return editor_key
+
+
+def save_edits(reviews_data, edits):
+    # Persist all edits with a single incremental load of the changed rows.
+    # edits may be the pending_edits dict itself, which is emptied below.
+    edits = {review_id: {column: value for column, value in changes.items() if pd.notna(value)} for review_id, changes in edits.items()}
+    review_ids = np.array(list(edits), dtype=object)
+    positions = review_id_index(reviews_data).get_indexer(review_ids)
+    found = positions >= 0
+    update_df = apply_edits(reviews_data.iloc[positions[found]], {review_id: edits[review_id] for review_id in review_ids[found]})
+    update_df = upstream_scores(update_df)
+
+    job = write_table(st.secrets['reviews_path'], update_df, is_incremental=True)
+    if job is None:
+        return False
+    for review_id in review_ids[found]:
+        st.session_state['saved_edits'].setdefault(review_id, {}).update(edits[review_id])
+    for review_id in review_ids:
+        st.session_state['pending_edits'].pop(review_id, None)
+    st.session_state['saves'] = st.session_state.get('saves', 0) + 1
+    return True
+
+
+@st.fragment(run_every=DUPLICATES_POLL_INTERVAL)
+def duplicates_pending(reviews_data):
+    # Clusters are computed in a background thread, the page is rerun once they are ready.
+    st.caption('_🚫 Looking for near-duplicate reviews in the background..._')
+    if duplicate_clusters(st.secrets['reviews_path'], reviews_data, data_version(reviews_data)) is not None:
+        st.rerun()
+
+
+def duplicates(data, reviews_data, read_only=False):
+    clusters = duplicate_clusters(st.secrets['reviews_path'], reviews_data, data_version(reviews_data))
+    if clusters is None:
+        duplicates_pending(reviews_data)
+        return
+    cluster_reviews = data.assign(REVIEW_ID=data['REVIEW_ID'].astype(str)).merge(clusters, on='REVIEW_ID', how='inner')
+    with st.expander(f"🚫 Possible spam: {cluster_reviews['CLUSTER_ID'].nunique():,} clusters of near-duplicate reviews"):
+        if cluster_reviews.empty:
+            st.caption('_No near-duplicate reviews found for the selected filters._')
+            return
+
+        cluster_summary = (
+            cluster_reviews
+            .groupby('CLUSTER_ID')
+            .agg(CLUSTER_SIZE=('CLUSTER_SIZE', 'first'), REVIEW_TEXT=('REVIEW_TEXT', 'first'), NEW=('STATUS', lambda x: (x != '🚫 Spam').sum()))
+            .sort_values(['NEW', 'CLUSTER_SIZE'], ascending=False)
+            .reset_index()
+        )
+        cluster_id = st.selectbox(
+            'Cluster',
+            cluster_summary['CLUSTER_ID'],
+            format_func=lambda c: cluster_summary.loc[cluster_summary['CLUSTER_ID'] == c, 'REVIEW_TEXT'].iloc[0][:120],
+            label_visibility='collapsed'
+        )
+        selected_cluster = cluster_reviews[cluster_reviews['CLUSTER_ID'] == cluster_id]
+        st.caption(f"_{selected_cluster['CLUSTER_SIZE'].iloc[0]:,} reviews in total, {len(selected_cluster):,} within the selected filters._")
+        st.dataframe(
+            selected_cluster[['REVIEW_DATE', 'REVIEWER_NAME', 'RATING', 'REVIEW_TEXT', 'STATUS', 'ADDRESS']],
+            column_config={
+                'REVIEW_DATE': 'Date',
+                'REVIEWER_NAME': 'Author',
+                'RATING': 'Rating',
+                'REVIEW_TEXT': st.column_config.Column('Review', width="large"),
+                'STATUS': 'Status',
+                'ADDRESS': 'Location'
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+        if not read_only and st.button('🚫 Mark cluster as spam', key='mark_cluster_spam'):
+            cluster_ids = clusters.loc[clusters['CLUSTER_ID'] == cluster_id, 'REVIEW_ID'].astype(str)
+            edits = {review_id: dict(changes) for review_id, changes in st.session_state['pending_edits'].items()}
+            for review_id in cluster_ids:
+                edits.setdefault(review_id, {})['STATUS'] = '🚫 Spam'
+            if save_edits(reviews_data, edits):
+                st.success(f'{len(cluster_ids):,} reviews marked as spam.')
+                st.rerun()
+
+
+def support(data, reviews_data, read_only=False):
+    # read_only when the reviews come from a static snapshot, edits saved to Keboola wouldn't show up in it.
     st.markdown("<br>", unsafe_allow_html=True)
     filtered_review_data_detailed = data[data['REVIEW_TEXT'].notna()].sort_values('REVIEW_DATE', ascending=False)
     if filtered_review_data_detailed.empty:
         st.info('No reviews with feedback text available for the selected filters.', icon=':material/info:')
         st.stop()
-    filtered_review_data_detailed['SELECT'] = [True] + [False] * (len(filtered_review_data_detailed) - 1)
+    if read_only:
+        st.info('Reviews are read from the review store snapshot, status, notes and responses can\'t be saved here.', icon=':material/info:')
+    filtered_review_data_detailed = apply_edits(filtered_review_data_detailed, st.session_state['saved_edits'])
     #filtered_review_data_detailed['RATING'] = filtered_review_data_detailed['RATING'].astype(int)
     filtered_review_data_detailed['CUSTOMER_SUCCESS_NOTES'] = filtered_review_data_detailed['CUSTOMER_SUCCESS_NOTES'].fillna('')
+    editor_key = editor_input(filtered_review_data_detailed, reviews_data)
     df_to_edit = st.data_editor(
-        filtered_review_data_detailed[['SELECT', 'REVIEW_ID','REVIEWER_NAME', 'SENTIMENT', 'REVIEW_TEXT', 'RATING', 'ADDRESS',
-                                    'REVIEW_DATE', 'CUSTOMER_SUCCESS_NOTES', 'REVIEW_URL', 'STATUS', 'RESPONSE']],
+        st.session_state['editor_input'],
                                     #.style.map(sentiment_color, subset=["OVERALL_SENTIMENT"]),
         column_order=('SELECT', 'REVIEW_DATE', 'REVIEWER_NAME', 'RATING', 'REVIEW_TEXT', 'SENTIMENT', 'STATUS', 'ADDRESS', 'REVIEW_URL', 'RESPONSE', 'CUSTOMER_SUCCESS_NOTES'), 
         column_config={
@@ -61,10 +221,24 @@ def support(data, reviews_data):
                     'RESPONSE': 'Response',
                     'CUSTOMER_SUCCESS_NOTES': 'Customer Success Notes'
                     },
-        disabled=['SENTIMENT', 'REVIEW_TEXT', 'RATING', 'REVIEW_DATE', 'REVIEWER_NAME', 'ADDRESS', 'REVIEW_URL', 'RESPONSE'],
+        disabled=['SENTIMENT', 'REVIEW_TEXT', 'RATING', 'REVIEW_DATE', 'REVIEWER_NAME', 'ADDRESS', 'REVIEW_URL', 'RESPONSE'] + (EDITABLE_COLUMNS if read_only else []),
         use_container_width=True, 
-        hide_index=True
+        hide_index=True,
+        key=editor_key
     )
+    track_edits(filtered_review_data_detailed, df_to_edit)
+    st.session_state['selected_reviews'] = df_to_edit.loc[df_to_edit['SELECT'] == True, 'REVIEW_ID'].astype(str).tolist()
+
+    pending_count = len(st.session_state['pending_edits'])
+    if pending_count > 0 and not read_only:
+        col1, col2 = st.columns([0.8, 0.2], vertical_alignment='center')
+        col1.caption(f"_{pending_count:,} reviews with unsaved changes._")
+        if col2.button('💾 Save changes', use_container_width=True):
+            if save_edits(reviews_data, st.session_state['pending_edits']):
+                st.success('Changes saved successfully!')
+                st.rerun()
+
+    duplicates(filtered_review_data_detailed, reviews_data, read_only)
     
     selected_sum = df_to_edit['SELECT'].sum()
 
@@ -95,7 +269,7 @@ Author: {author_name}
                 response = st.session_state['generated_responses'][review_text]
             else:
                 with st.spinner(':robot_face: Generating response, please wait...'):
-                    response = generate_response(prompt)
+                    response = draft_response(prompt)
                 if response:
                     st.session_state['generated_responses'][review_text] = response
                 else:
@@ -128,41 +302,24 @@ Additional instruction: {instruction}
 
 Please provide an updated response incorporating the additional instruction.
 """
-                            response = generate_response(new_prompt)
+                            response = draft_response(new_prompt)
                             if response:
                                 st.session_state['generated_responses'][review_text] = response
                                 st.session_state.regenerate_clicked = False
                                 st.session_state.instruction = ''
                                 st.rerun()
         
-                if col3.button('💾 Save response', use_container_width=True):
-                    review_id = selected_review['REVIEW_ID']
-                    filtered_review_data_detailed['RESPONSE'] = filtered_review_data_detailed['RESPONSE'].astype('object')
-                    filtered_review_data_detailed.loc[filtered_review_data_detailed['REVIEW_ID'] == review_id, 'RESPONSE'] = edited_response
-                    
-                    try:
-                        update_df = pd.DataFrame({
-                            'REVIEW_ID': [review_id],
-                            'RESPONSE': [edited_response],
-                            'STATUS': ['✔️ Resolved'] if selected_review['STATUS'] == '🌱 New' else [selected_review['STATUS']],
-                            'CUSTOMER_SUCCESS_NOTES': [selected_review['CUSTOMER_SUCCESS_NOTES']]
-                        })
-                        update_df['RESPONSE'] = update_df['RESPONSE'].astype(str)
-                        update_df['STATUS'] = update_df['STATUS'].astype(str)
-                        update_df['CUSTOMER_SUCCESS_NOTES'] = update_df['CUSTOMER_SUCCESS_NOTES'].astype(str)
-                        
-                        reviews_data.loc[reviews_data['REVIEW_ID'] == review_id, ['RESPONSE', 'STATUS', 'CUSTOMER_SUCCESS_NOTES']] = [
-                            update_df['RESPONSE'].iloc[0],
-                            update_df['STATUS'].iloc[0], 
-                            update_df['CUSTOMER_SUCCESS_NOTES'].iloc[0]
-                        ]
-                        
-                        update_df = reviews_data[reviews_data['REVIEW_ID'] == review_id].copy()
-                        write_table(st.secrets['reviews_path'], update_df, is_incremental=True)
+                if not read_only and col3.button('💾 Save response', use_container_width=True):
+                    review_id = str(selected_review['REVIEW_ID'])
+                    edits = {**st.session_state['pending_edits']}
+                    edits[review_id] = {
+                        **edits.get(review_id, {}),
+                        'RESPONSE': edited_response,
+                        'STATUS': '✔️ Resolved' if selected_review['STATUS'] == '🌱 New' else selected_review['STATUS']
+                    }
+                    if save_edits(reviews_data, edits):
                         st.success('Response saved successfully!')
-                    except Exception as e:
-                        st.error(f'Failed to save response: {str(e)}')
-                        
+
     elif selected_sum > 1:
         st.info('Select only one review to generate a response.')
     else:
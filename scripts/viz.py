@@ -1,5 +1,30 @@
 import streamlit as st
-import plotly.express as px
+import pandas as pd
+import numpy as np
+
+from scripts.memo import memoize, memoize_figure
+
+MAX_TIME_POINTS = 120
+TIME_BUCKETS = [('D', 'Day', 1), ('W', 'Week', 7), ('M', 'Month', 31), ('Q', 'Quarter', 92)]
+
+
+def time_buckets(dates, max_points=MAX_TIME_POINTS):
+    # The finest of day/week/month/quarter that keeps the selected date range within max_points.
+    dates = pd.to_datetime(dates)
+    span_days = (dates.max() - dates.min()).days + 1 if dates.notna().any() else 1
+    for frequency, label, days in TIME_BUCKETS:
+        if span_days / days <= max_points:
+            break
+    return dates.dt.to_period(frequency).dt.start_time.rename('REVIEW_DATE'), label
+
+
+def rating_color_scale(ratings):
+    ratings = np.asarray(ratings, dtype=float)
+    return np.select(
+        [ratings < 1.5, ratings < 2.5, ratings < 3.6, ratings < 4.5],
+        ['#EA4335', '#e98f41', '#FBBC05', '#a5c553'],
+        default='#34A853'
+    ).tolist()
 
 
 def sentiment_color(val):
@@ -30,16 +55,54 @@ def generate_html(label, main_value, sub_label, sub_value, always_show_subtext=F
     """
     st.markdown(html_code, unsafe_allow_html=True)
 
-def metrics(location_count_total, review_count_total, avg_rating_total, filtered_data, show_pie=False):    
+def metric_values(filtered_data):
+    filtered_review_count = len(filtered_data)
+    filtered_avg_rating = filtered_data['RATING'].mean() if filtered_review_count > 0 else 0
+    filtered_unique_locations = filtered_data['PLACE_ID'].nunique()
+    return filtered_review_count, filtered_avg_rating, filtered_unique_locations
+
+
+def sentiment_donut(filtered_data):
+    # Plotly Express is only needed for the pie, the Locations page renders without it.
+    import plotly.express as px
+    word_rating_colors = {'Negative': '#EA4335', 'Mixed': '#FBBC05', 'Unknown': '#B3B3B3', 'Positive': '#34A853'}
+    sentiment_counts = filtered_data['SENTIMENT'].value_counts()
+    fig_sentiment_donut = px.pie(
+        sentiment_counts,
+        values=sentiment_counts.values,
+        names=[f"{count:,} ({percentage:.1f}%)" for count, percentage in zip(sentiment_counts.values, (sentiment_counts / sentiment_counts.sum() * 100).round(2))],
+        hole=0.3,
+        color=sentiment_counts.index,
+        color_discrete_map=word_rating_colors
+    )
+
+    fig_sentiment_donut.update_traces(textinfo='none', hoverinfo='skip')
+    
+    fig_sentiment_donut.update_layout(
+        height=120,
+        margin=dict(l=20, r=20, t=0, b=50),  
+        paper_bgcolor='rgba(0,0,0,0)',         
+        showlegend=True,                       
+        legend=dict(
+            orientation="h",                   
+            x=0.5,                             
+            xanchor="center",
+            y=-0.2,
+            yanchor="top"
+        ),
+        hovermode=False
+    )
+    return fig_sentiment_donut
+
+
+def metrics(location_count_total, review_count_total, avg_rating_total, filtered_data, show_pie=False, signature=None):    
     # Metrics for all
     all_review_count = review_count_total
     all_avg_rating = avg_rating_total
     all_unique_locations = location_count_total
     
     # Metrics for filtered
-    filtered_review_count = len(filtered_data)
-    filtered_avg_rating = filtered_data['RATING'].mean() if filtered_review_count > 0 else 0
-    filtered_unique_locations = filtered_data['PLACE_ID'].nunique()
+    filtered_review_count, filtered_avg_rating, filtered_unique_locations = memoize(signature, 'metrics', lambda: metric_values(filtered_data))
 
     with st.container(border=True):
         col1, col2, col3 = st.columns(3)
@@ -56,33 +119,7 @@ def metrics(location_count_total, review_count_total, avg_rating_total, filtered
                     """
                 st.markdown(html_code, unsafe_allow_html=True)
 
-                word_rating_colors = {'Negative': '#EA4335', 'Mixed': '#FBBC05', 'Unknown': '#B3B3B3', 'Positive': '#34A853'}
-                sentiment_counts = filtered_data['SENTIMENT'].value_counts()
-                fig_sentiment_donut = px.pie(
-                    sentiment_counts,
-                    values=sentiment_counts.values,
-                    names=[f"{count:,} ({percentage:.1f}%)" for count, percentage in zip(sentiment_counts.values, (sentiment_counts / sentiment_counts.sum() * 100).round(2))],
-                    hole=0.3,
-                    color=sentiment_counts.index,
-                    color_discrete_map=word_rating_colors
-                )
-
-                fig_sentiment_donut.update_traces(textinfo='none', hoverinfo='skip')
-                
-                fig_sentiment_donut.update_layout(
-                    height=120,
-                    margin=dict(l=20, r=20, t=0, b=50),  
-                    paper_bgcolor='rgba(0,0,0,0)',         
-                    showlegend=True,                       
-                    legend=dict(
-                        orientation="h",                   
-                        x=0.5,                             
-                        xanchor="center",
-                        y=-0.2,
-                        yanchor="top"
-                    ),
-                    hovermode=False
-                )
+                fig_sentiment_donut = memoize_figure(signature, 'sentiment_donut', lambda: sentiment_donut(filtered_data))
                 st.plotly_chart(fig_sentiment_donut, use_container_width=True)
             else:
                 generate_html("⭐️ Average Rating", f"{filtered_avg_rating:.2f}", "avg for all", f"{all_avg_rating:.2f}")
@@ -4,17 +4,20 @@ import pandas as pd
 
 from streamlit_option_menu import option_menu
 
-from scripts.locations import locations
-from scripts.overview import overview
-from scripts.ai_analysis import ai_analysis
-from scripts.support import support
-from scripts.openai import assistant
-
-from scripts.sapi import read_data
+from scripts.sapi import read_data, read_csv, read_attributes, data_version, parsed_dates, load_sources, load_timings
+from scripts.search import search_reviews, filter_by_search
 from scripts.viz import metrics
+from scripts.memo import memoize, filter_signature, cache_summary
+from scripts.anomalies import rating_anomalies
+from scripts.geo import spatial_index, nearest_locations
 
 st.set_page_config(layout="wide")
 
+# Filtered frames are copy-on-write views of the shared tables (always on from pandas 3).
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+REVIEWS_STORE=st.secrets.get('reviews_store_path')
 ASSISTANT_ID=st.secrets['ASSISTANT_ID']
 FILE_ID=st.secrets['FILE_ID']
 LOGO_URL=st.secrets['LOGO_URL']
@@ -23,11 +26,16 @@ LOGO_URL=st.secrets['LOGO_URL']
 session_defaults = {
     "thread_id": None,
     "messages": [{'role': 'assistant', 'content': 'Welcome! How can I assist you today?'}],
+    "history_window": 10,
+    "attached_file_id": None,
     "table_written": False,
     "new_prompt": None,
     "instruction": '',
     "regenerate_clicked": False,
-    "generated_responses": {}
+    "generated_responses": {},
+    "pending_edits": {},
+    "saved_edits": {},
+    "selected_reviews": []
 }
 for key, value in session_defaults.items():
     if key not in st.session_state:
@@ -38,18 +46,6 @@ icons=['pin-map-fill', 'people', 'file-bar-graph', 'chat-heart', 'robot']
 
 menu_id = option_menu(None, options=options, icons=icons, key='menu_id', orientation="horizontal")
 
-locations_data = pd.read_csv(st.secrets['locations_path'])
-reviews_data = read_data(st.secrets['reviews_path'])
-attributes = pd.read_csv(st.secrets['attributes_path'])
-bot_data = pd.read_csv(st.secrets['bot_path'])
-
-pronouns_to_remove = ['i', 'you', 'she', 'he', 'it', 'we', 'they', 'I', 'You', 'She', 'He', 'It', 'We', 'They', 'Pete']
-attributes = attributes[~attributes['ENTITY'].isin(pronouns_to_remove)]
-attributes = attributes.groupby(['ENTITY', 'ATTRIBUTE'])['COUNT'].sum().reset_index()
-attributes = attributes[attributes['COUNT'] > 20]
-
-reviews_data['RATING'] = reviews_data['RATING'].astype(int)
-
 ## LOGO
 st.sidebar.markdown(
     f'''
@@ -60,6 +56,55 @@ st.sidebar.markdown(
     unsafe_allow_html=True
 )
 
+# With a partitioned review store only the slice for the selected states and dates is read, see scripts/review_store.py.
+store = None
+if REVIEWS_STORE:
+    from scripts.review_store import store_version, store_date_range, read_slice, place_totals, store_anomalies
+    store = store_version(REVIEWS_STORE)
+    if store is None:
+        st.sidebar.warning(f'No review store found at {REVIEWS_STORE}, loading the whole reviews table.', icon=':material/warning:')
+
+# Loaded after the menu and logo are drawn, so the first paint does not wait for the tables.
+# All sources load concurrently, the filters need locations and reviews, the other tables are awaited by their page.
+source_loaders = {
+    'locations': (read_csv, st.secrets['locations_path']),
+    'attributes': (read_attributes, st.secrets['attributes_path']),
+    'bot': (read_csv, st.secrets['bot_path'])
+}
+if not store:
+    source_loaders['reviews'] = (read_data, st.secrets['reviews_path'])
+sources = load_sources(source_loaders)
+with st.spinner('Loading data... 📊'):
+    locations_data = sources['locations'].result()
+    reviews_data = None if store else sources['reviews'].result()
+# The spatial index is built on the full table, filtered frames keep its DATA_VERSION in attrs.
+all_locations = locations_data
+location_index = spatial_index(all_locations)
+
+def select_dates(container, min_date, max_date):
+    date_options = ['Last Week', 'Last Month', 'Last 3 Months', 'All Time', 'Other']
+    date_selection = container.selectbox('Select a date', date_options, index=None, placeholder='All')
+    if date_selection is None:
+        start_date = min_date
+        end_date = max_date
+    elif date_selection == 'Other':
+        start_date, end_date = container.slider('Select date range', value=[min_date.date(), max_date.date()], min_value=min_date.date(), max_value=max_date.date(), key='date_input')
+        start_date = pd.to_datetime(start_date)
+        end_date = pd.to_datetime(end_date).replace(hour=23, minute=59)
+    else:
+        # Whole days, so the window and the signatures keyed on it only change once a day.
+        today = pd.to_datetime('today').floor('D')
+        end_date = today + pd.Timedelta(hours=23, minutes=59, seconds=59)
+        if date_selection == 'Last Week':
+            start_date = today - pd.DateOffset(weeks=1)
+        elif date_selection == 'Last Month':
+            start_date = today - pd.DateOffset(months=1)
+        elif date_selection == 'Last 3 Months':
+            start_date = today - pd.DateOffset(months=3)
+        elif date_selection == 'All Time':
+            start_date = min_date
+    return start_date, end_date
+
 ## FILTERS
 # Category Selection
 category_options = locations_data['CATEGORY'].unique().tolist()
@@ -72,11 +117,18 @@ else:
 locations_data = locations_data[locations_data['CATEGORY'].isin(selected_category)]
 location_count_total = len(locations_data)
 data_collected_at = locations_data['DATA_COLLECTED_AT'].max()
+version = store if store else data_version(reviews_data)
 
 # Merge locations and reviews data and get the count of reviews data based on selected category
-merged_data = pd.merge(locations_data, reviews_data, on='PLACE_ID', how='inner')
-review_count_total = len(merged_data)
-avg_rating_total = merged_data['RATING'].mean().round(2)
+def category_totals():
+    if store:
+        totals = place_totals(REVIEWS_STORE, store).merge(locations_data[['PLACE_ID']], on='PLACE_ID', how='inner')
+        review_count = int(totals['REVIEWS'].sum())
+        return review_count, round(totals['RATING_SUM'].sum() / review_count, 2) if review_count > 0 else float('nan')
+    merged_data = pd.merge(locations_data, reviews_data, on='PLACE_ID', how='inner')
+    return len(merged_data), merged_data['RATING'].mean().round(2)
+
+review_count_total, avg_rating_total = memoize(filter_signature(category=category, version=version), 'totals', category_totals)
 
 # State Selection
 state_options = sorted(locations_data['COUNTRY_CODE'].unique().tolist())
@@ -106,58 +158,98 @@ else:
     selected_location = location_options
 locations_data = locations_data[locations_data['ADDRESS'].isin(selected_location)]
 
+# Radius Selection
+address_ids = memoize(filter_signature(locations_version=data_version(all_locations)), 'address_ids', lambda: (
+    all_locations.dropna(subset=['LATITUDE', 'LONGITUDE']).drop_duplicates('ADDRESS').set_index('ADDRESS')['PLACE_ID'].sort_index().to_dict()
+))
+near = st.sidebar.selectbox('Near a location', list(address_ids), index=None, placeholder='Anywhere')
+radius = None
+anchor_id = None
+if near is not None:
+    radius = st.sidebar.slider('Within (km)', min_value=1, max_value=500, value=25)
+    anchor_id = address_ids[near]
+    nearby_ids, _ = location_index.within(*location_index.location(anchor_id), radius)
+    locations_data = locations_data[locations_data['PLACE_ID'].isin(nearby_ids)]
+
+# Review filters are drawn above the date selection, which is evaluated first when reading from the review store.
+review_filters = st.sidebar.container()
+date_filters = st.sidebar.container()
+
+if store:
+    selected_states = tuple(sorted(selected_state))
+    store_min_date, store_max_date = store_date_range(REVIEWS_STORE, store, selected_states)
+    if store_min_date is None:
+        st.info('No data available for the selected filters.', icon=':material/info:')
+        st.stop()
+    start_date, end_date = select_dates(date_filters, store_min_date, store_max_date)
+    # Whole days keep the slice cacheable for relative selections, the exact range is applied below.
+    reviews_data = read_slice(REVIEWS_STORE, store, selected_states, start_date.floor('D'), end_date.floor('D') + pd.Timedelta(hours=23, minutes=59, seconds=59))
+    version = data_version(reviews_data)
+
 # Filter reviews based on selected locations
-filtered_reviews = reviews_data[reviews_data['PLACE_ID'].isin(locations_data['PLACE_ID'])]
+# Every stage is memoized under the signature of the selection so far, shared across tabs and sessions.
+location_signature = filter_signature(category=category, state=state, city=city, location=location, near=near, radius=radius, version=version)
+
+def reviews_for_locations():
+    reviews = reviews_data[reviews_data['PLACE_ID'].isin(locations_data['PLACE_ID'])]
+    return reviews.assign(REVIEW_DATE=parsed_dates(reviews_data).loc[reviews.index])
+
+filtered_reviews = memoize(location_signature, 'reviews', reviews_for_locations)
 
 # Sentiment Selection
-sentiment_options = sorted(filtered_reviews['SENTIMENT'].unique().tolist())
-sentiment = st.sidebar.multiselect('Select a sentiment', sentiment_options, placeholder='All')
+sentiment_options = memoize(location_signature, 'sentiment_options', lambda: sorted(filtered_reviews['SENTIMENT'].unique().tolist()))
+sentiment = review_filters.multiselect('Select a sentiment', sentiment_options, placeholder='All')
 if len(sentiment) > 0:
     selected_sentiment = sentiment
 else:
     selected_sentiment = sentiment_options
-filtered_reviews = filtered_reviews[filtered_reviews['SENTIMENT'].isin(selected_sentiment)]
+sentiment_signature = filter_signature(parent=location_signature, sentiment=sentiment)
+filtered_reviews = memoize(sentiment_signature, 'reviews', lambda: filtered_reviews[filtered_reviews['SENTIMENT'].isin(selected_sentiment)])
 
 # Rating Selection
-rating_options = sorted(filtered_reviews['RATING'].unique().tolist())
-rating = st.sidebar.multiselect('Select a review rating', rating_options, placeholder='All')
+rating_options = memoize(sentiment_signature, 'rating_options', lambda: sorted(filtered_reviews['RATING'].unique().tolist()))
+rating = review_filters.multiselect('Select a review rating', rating_options, placeholder='All')
 if len(rating) > 0:
     selected_rating = rating
 else:
     selected_rating = rating_options
-filtered_reviews = filtered_reviews[filtered_reviews['RATING'].isin(selected_rating)]
+
+# Text Search
+search_query = review_filters.text_input('Search reviews', placeholder='e.g. roaming', help='Full-text search in review text and keywords. Use * for prefix search, e.g. roam*.')
+
+def reviews_for_rating_and_search():
+    reviews = filtered_reviews[filtered_reviews['RATING'].isin(selected_rating)]
+    if search_query.strip():
+        # A store slice gets its own index, built once, instead of syncing one index from slice to slice.
+        search_table = f'{REVIEWS_STORE}@{version}' if store else st.secrets['reviews_path']
+        matched_review_ids = search_reviews(search_table, reviews_data, version, search_query)
+        reviews = filter_by_search(reviews, matched_review_ids)
+    return reviews
+
+search_signature = filter_signature(parent=sentiment_signature, rating=rating, search=search_query.strip())
+filtered_reviews = memoize(search_signature, 'reviews', reviews_for_rating_and_search)
 
 # Date Selection
-date_options = ['Last Week', 'Last Month', 'Last 3 Months', 'All Time', 'Other']
-date_selection = st.sidebar.selectbox('Select a date', date_options, index=None, placeholder='All')
-min_date = pd.to_datetime(filtered_reviews['REVIEW_DATE'].min())
-max_date = pd.to_datetime(filtered_reviews['REVIEW_DATE'].max())
-
-if date_selection is None:
-    start_date = min_date
-    end_date = max_date
-elif date_selection == 'Other':
-    start_date, end_date = st.sidebar.slider('Select date range', value=[min_date.date(), max_date.date()], min_value=min_date.date(), max_value=max_date.date(), key='date_input')
-    start_date = pd.to_datetime(start_date)
-    end_date = pd.to_datetime(end_date).replace(hour=23, minute=59)
-else:
-    end_date = pd.to_datetime('today')
-    if date_selection == 'Last Week':
-        start_date = end_date - pd.DateOffset(weeks=1)
-    elif date_selection == 'Last Month':
-        start_date = end_date - pd.DateOffset(months=1)
-    elif date_selection == 'Last 3 Months':
-        start_date = end_date - pd.DateOffset(months=3)
-    elif date_selection == 'All Time':
-        start_date = min_date
+min_date, max_date = memoize(search_signature, 'date_bounds', lambda: (
+    pd.to_datetime(filtered_reviews['REVIEW_DATE'].min()),
+    pd.to_datetime(filtered_reviews['REVIEW_DATE'].max())
+))
+if not store:
+    start_date, end_date = select_dates(date_filters, min_date, max_date)
 
 selected_date_range = (start_date, end_date)
 
-# Convert REVIEW_DATE to datetime for comparison
-filtered_reviews['REVIEW_DATE'] = pd.to_datetime(filtered_reviews['REVIEW_DATE'])
-filtered_reviews = filtered_reviews[filtered_reviews['REVIEW_DATE'].between(selected_date_range[0], selected_date_range[1])]
+# The range is clamped to the data, so e.g. 'All Time' and no selection share a signature.
+filter_key = filter_signature(
+    parent=search_signature,
+    date_range=(max(start_date, min_date), min(end_date, max_date)) if start_date <= max_date and end_date >= min_date else None
+)
+
+def filtered_data():
+    reviews = filtered_reviews[filtered_reviews['REVIEW_DATE'].between(selected_date_range[0], selected_date_range[1])]
+    return reviews.merge(locations_data, on='PLACE_ID', how='inner')
 
-filtered_locations_with_reviews = filtered_reviews.merge(locations_data, on='PLACE_ID', how='inner')
+filtered_locations_with_reviews = memoize(filter_key, 'merged', filtered_data)
 
 if filtered_locations_with_reviews.empty:
     st.info('No data available for the selected filters.', icon=':material/info:')
@@ -165,22 +257,43 @@ if filtered_locations_with_reviews.empty:
 
 st.sidebar.divider()
 st.sidebar.caption(f"**Data last updated on:** {data_collected_at}.")
+st.sidebar.caption(cache_summary())
+if load_timings():
+    st.sidebar.caption(load_timings())
 
 ## TABS
+# Page modules are imported when their page is first opened, keeping heavy libraries
+# (pydeck, networkx, matplotlib, wordcloud, the OpenAI SDK) out of the cold start.
 if menu_id == 'Locations':    
-    metrics(location_count_total, review_count_total, avg_rating_total, filtered_locations_with_reviews)
-    locations(filtered_locations_with_reviews)
+    from scripts.locations import locations
+    anomalies = store_anomalies(REVIEWS_STORE, store) if store else rating_anomalies(reviews_data)
+    metrics(location_count_total, review_count_total, avg_rating_total, filtered_locations_with_reviews, signature=filter_key)
+    anchor = None
+    competitors = None
+    if anchor_id is not None:
+        anchor = location_index.location(anchor_id)
+        competitors = nearest_locations(all_locations, anchor_id)
+    locations(filtered_locations_with_reviews, signature=filter_key, anomalies=anomalies, anchor=anchor, competitors=competitors)
 
 if menu_id == 'Overview':
-    metrics(location_count_total, review_count_total, avg_rating_total, filtered_locations_with_reviews)
-    overview(filtered_locations_with_reviews)
+    from scripts.overview import overview
+    anomalies = store_anomalies(REVIEWS_STORE, store) if store else rating_anomalies(reviews_data)
+    metrics(location_count_total, review_count_total, avg_rating_total, filtered_locations_with_reviews, signature=filter_key)
+    overview(filtered_locations_with_reviews, signature=filter_key, anomalies=anomalies)
 
 if menu_id == 'AI Analysis':
-    metrics(location_count_total, review_count_total, avg_rating_total, filtered_locations_with_reviews, show_pie=True)
-    ai_analysis(filtered_locations_with_reviews, attributes)
+    from scripts.ai_analysis import ai_analysis
+    with st.spinner('Loading data... 📊'):
+        attributes = sources['attributes'].result()
+    metrics(location_count_total, review_count_total, avg_rating_total, filtered_locations_with_reviews, show_pie=True, signature=filter_key)
+    ai_analysis(filtered_locations_with_reviews, attributes, signature=filter_key)
 
 if menu_id == 'Support':
-    support(filtered_locations_with_reviews, reviews_data)
+    from scripts.support import support
+    support(filtered_locations_with_reviews, reviews_data, read_only=bool(store))
 
 if menu_id == 'Assistant':
-    assistant(file_id=st.secrets['FILE_ID'], assistant_id=st.secrets['ASSISTANT_ID'], bot_data=bot_data)
\ No newline at end of file
+    from scripts.openai import assistant
+    with st.spinner('Loading data... 📊'):
+        bot_data = sources['bot'].result()
+    assistant(file_id=st.secrets['FILE_ID'], assistant_id=st.secrets['ASSISTANT_ID'], bot_data=bot_data, data=filtered_locations_with_reviews)
\ No newline at end of file
@@ -0,0 +1,141 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from streamlit.testing.v1 import AppTest
+
+from scripts import support
+from scripts.scoring import fill_missing_scores
+
+
+@pytest.fixture
+def session_state(monkeypatch):
+    state = {'pending_edits': {}, 'saved_edits': {}}
+    monkeypatch.setattr(support.st, 'session_state', state)
+    monkeypatch.setattr(support.st, 'secrets', {'reviews_path': 'in.c-reviews.reviews'})
+    return state
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    written = []
+    monkeypatch.setattr(support, 'write_table', lambda table_id, df, is_incremental: written.append(df) or 'job')
+    return written
+
+
+def reviews():
+    return pd.DataFrame({
+        'REVIEW_ID': ['a', 'b', 'c'],
+        'STATUS': ['🌱 New', '🌱 New', '✔️ Resolved'],
+        'CUSTOMER_SUCCESS_NOTES': [None, 'called back', None]
+    })
+
+
+def test_diff_edits_keeps_only_changed_cells():
+    original = reviews()
+    edited = original.assign(STATUS=['🌱 New', '✔️ Resolved', np.nan], CUSTOMER_SUCCESS_NOTES=[None, 'called back', 'refund'])
+    assert support.diff_edits(original, edited, support.EDITABLE_COLUMNS) == {
+        'b': {'STATUS': '✔️ Resolved'},
+        'c': {'CUSTOMER_SUCCESS_NOTES': 'refund'}
+    }
+
+
+def test_track_edits_replaces_edits_of_shown_rows(session_state):
+    session_state['pending_edits'] = {'a': {'STATUS': '✔️ Resolved'}, 'z': {'STATUS': '🚫 Spam'}}
+    original = reviews()
+    edited = original.assign(CUSTOMER_SUCCESS_NOTES=[None, None, 'refund'])
+    support.track_edits(original, edited)
+    assert session_state['pending_edits'] == {
+        'z': {'STATUS': '🚫 Spam'},
+        'b': {'CUSTOMER_SUCCESS_NOTES': ''},
+        'c': {'CUSTOMER_SUCCESS_NOTES': 'refund'}
+    }
+
+
+def test_save_edits_of_pending_edits(session_state, uploads):
+    session_state['pending_edits'] = {'a': {'STATUS': '✔️ Resolved'}, 'b': {'STATUS': np.nan, 'CUSTOMER_SUCCESS_NOTES': 'spam?'}}
+    assert support.save_edits(reviews(), session_state['pending_edits'])
+    assert session_state['pending_edits'] == {}
+    assert session_state['saved_edits'] == {'a': {'STATUS': '✔️ Resolved'}, 'b': {'CUSTOMER_SUCCESS_NOTES': 'spam?'}}
+    [update_df] = uploads
+    assert update_df['REVIEW_ID'].tolist() == ['a', 'b']
+    assert update_df['STATUS'].tolist() == ['✔️ Resolved', '🌱 New']
+    assert update_df['CUSTOMER_SUCCESS_NOTES'].iloc[1] == 'spam?'
+
+
+def test_failed_save_keeps_pending_edits(session_state, monkeypatch):
+    monkeypatch.setattr(support, 'write_table', lambda table_id, df, is_incremental: None)
+    session_state['pending_edits'] = {'a': {'STATUS': '✔️ Resolved'}}
+    assert not support.save_edits(reviews(), session_state['pending_edits'])
+    assert session_state['pending_edits'] == {'a': {'STATUS': '✔️ Resolved'}}
+    assert session_state['saved_edits'] == {}
+
+
+def test_save_edits_writes_upstream_scores(session_state, uploads):
+    scored = fill_missing_scores(reviews().assign(
+        REVIEW_TEXT=['great staff', 'rude and slow', None],
+        SENTIMENT=['Unknown', np.nan, 'Positive'],
+        KEYWORDS=[np.nan, np.nan, "['staff']"],
+        RATING=[5, 1, 4]
+    ))
+    assert scored['SENTIMENT'].tolist() == ['Positive', 'Negative', 'Positive']
+    assert support.save_edits(scored, {'a': {'STATUS': '✔️ Resolved'}, 'b': {'STATUS': '🚫 Spam'}})
+    [update_df] = uploads
+    assert list(update_df.columns) == list(reviews().columns) + ['REVIEW_TEXT', 'SENTIMENT', 'KEYWORDS', 'RATING']
+    assert update_df['SENTIMENT'].iloc[0] == 'Unknown'
+    assert update_df[['SENTIMENT', 'KEYWORDS']].iloc[1].isna().all()
+
+
+def support_app():
+    import pandas as pd
+    import streamlit as st
+    from scripts.support import support
+
+    for key, value in {'pending_edits': {}, 'saved_edits': {}, 'selected_reviews': [], 'generated_responses': {},
+                       'regenerate_clicked': False, 'instruction': ''}.items():
+        st.session_state.setdefault(key, value)
+    reviews = pd.DataFrame({
+        'REVIEW_ID': ['a', 'b', 'c'],
+        'REVIEWER_NAME': ['Ann', 'Bob', 'Cid'],
+        'SENTIMENT': ['Positive', 'Negative', 'Mixed'],
+        'REVIEW_TEXT': ['great staff', 'rude and slow', 'ok but queue'],
+        'RATING': [5, 1, 3],
+        'ADDRESS': ['Main St 1', 'Main St 1', 'High St 2'],
+        'REVIEW_DATE': pd.to_datetime(['2024-03-03', '2024-03-02', '2024-03-01']),
+        'CUSTOMER_SUCCESS_NOTES': [None, None, None],
+        'REVIEW_URL': ['https://example.com/a', 'https://example.com/b', 'https://example.com/c'],
+        'STATUS': ['🌱 New', '🌱 New', '🌱 New'],
+        'RESPONSE': [None, None, None]
+    })
+    reviews.attrs['DATA_VERSION'] = 'v1'
+    support(reviews, reviews)
+
+
+def run_with_edits(at, edited_rows):
+    # AppTest can't edit a data editor, so the widget state the frontend would send is added to the next run.
+    editor = next(element for element in at.dataframe if (element.key or '').startswith('support_editor_'))
+    widget_states = at._tree.get_widget_states()
+    state = widget_states.widgets.add()
+    state.id = editor.proto.id
+    state.string_value = json.dumps({'edited_rows': edited_rows, 'added_rows': [], 'deleted_rows': []})
+    return at._run(widget_states), editor.proto.id
+
+
+def test_editor_keeps_consecutive_edits():
+    at = AppTest.from_function(support_app)
+    at.secrets['reviews_path'] = 'in.c-reviews.reviews'
+    at.secrets['MINI_LOGO_URL'] = 'https://example.com/logo.png'
+    at.run()
+    assert not at.exception
+
+    at, first_id = run_with_edits(at, {'0': {'STATUS': '✔️ Resolved'}})
+    assert at.session_state['pending_edits'] == {'a': {'STATUS': '✔️ Resolved'}}
+    at, second_id = run_with_edits(at, {'0': {'STATUS': '✔️ Resolved'}, '1': {'CUSTOMER_SUCCESS_NOTES': 'called back'}})
+    assert not at.exception
+    assert second_id == first_id
+    assert at.session_state['pending_edits'] == {'a': {'STATUS': '✔️ Resolved'}, 'b': {'CUSTOMER_SUCCESS_NOTES': 'called back'}}
+    at.run()
+    editor = next(element for element in at.dataframe if (element.key or '').startswith('support_editor_'))
+    assert editor.proto.id == first_id